@@ -1,6 +1,11 @@
-from collections import deque, defaultdict
+from array import array
 import heapq 
 import math
+import bellmanFord
+import geoDistance
+import reachability
+
+INF = float('inf')
 
 CABIN_MULTIPLIERS = {
     "Economy": 1.0,
@@ -20,41 +25,121 @@ def calculate_cost(distance, stops):
     else:
         return round(distance * cost_per_km * 0.7, 2)
 
-def assign_neighbour(graph, departure_code, destination_code, cabin):
-    neighbours = []
-    routes = graph.get_routes(departure_code)
-    if not routes:
-        return neighbours
-
-    destination_country = graph.airport_info[destination_code]["country"]
-    dest_info = graph.airport_info[destination_code]
-    dest_lat = float(dest_info['latitude'])
-    dest_lon = float(dest_info['longitude'])
-
-    for route in routes:
-        neighbour = route["destination"]
-        neighbour_info = graph.airport_info[neighbour]
-        distance = route["km"]
-        time = route["min"]
-        price = round(distance * 0.5, 2)
-
-        neighbour_lat = float(neighbour_info["latitude"])
-        neighbour_lon = float(neighbour_info["longitude"])
-        dist_to_destination = round(twoAirportDist(neighbour_lat, neighbour_lon, dest_lat, dest_lon), 2)
-
-        if neighbour_info["country"] == destination_country:
-            neighbours.append((
-                [departure_code, neighbour],
-                distance,
-                time,
-                price,
-                cabin,
-                "Alternative via Nearby Airport",
-                dist_to_destination
-            ))
-
-    print("Returning neighbours with extra distances:", neighbours)
-    return neighbours
+MASK_BITS = 62
+
+class LabelStore:
+    # Search states as parent pointers: label i is airport[i] reached from
+    # label parent[i] (-1 for a start), so extending a path appends three
+    # ints instead of copying a list. mask[i] has bit (a % MASK_BITS) set for
+    # every airport a on the path; a clear bit proves an airport is not on
+    # it, and only a set bit walks the (short) parent chain to make sure.
+    def __init__(self):
+        self.airport = array('i')
+        self.parent = array('i')
+        self.mask = array('q')
+
+    def add(self, airport, parent=-1):
+        bit = 1 << (airport % MASK_BITS)
+        self.airport.append(airport)
+        self.parent.append(parent)
+        self.mask.append(self.mask[parent] | bit if parent >= 0 else bit)
+        return len(self.airport) - 1
+
+    def visited(self, label, airport):
+        # callers in hot loops test the mask bit inline first and only call
+        # this when it is set
+        if not self.mask[label] >> (airport % MASK_BITS) & 1:
+            return False
+        while label >= 0:
+            if self.airport[label] == airport:
+                return True
+            label = self.parent[label]
+        return False
+
+    def path(self, label):
+        # materialised only for results that are returned
+        path = []
+        while label >= 0:
+            path.append(self.airport[label])
+            label = self.parent[label]
+        path.reverse()
+        return path
+
+# how far from the requested airports the fallback search may start or end
+NEARBY_RADIUS_KM = 300
+MAX_ALTERNATIVES = 10
+
+def nearby_airports(graph, airport, radius_km):
+    if math.isnan(graph.latitude[airport]):
+        return [airport]
+    ids = graph.ids
+    return [ids[code] for code, km in graph.airports_within(graph.latitude[airport], graph.longitude[airport], radius_km)]
+
+def multi_source_search(graph, sources, sinks, stops=0, limit=MAX_ALTERNATIVES):
+    # stop-limited Dijkstra from a virtual super-source joined to every
+    # airport in sources, ending at any airport in sinks; yields up to limit
+    # (path, distance, minutes, stops) in increasing distance. Labels count
+    # flights, so like find_one_way_flights up to stops + 1 flights are taken.
+    max_flights = stops + 1
+    labels = LabelStore()
+    heap = []
+    best = {}
+    for airport in sources:
+        heapq.heappush(heap, (0, 0, airport, labels.add(airport), 0))
+        best[(airport, 0)] = 0
+    found = []
+    while heap and len(found) < limit:
+        dist, flights, airport, label, time = heapq.heappop(heap)
+        if dist > best[(airport, flights)]:
+            continue
+        if airport in sinks and flights >= 1:
+            found.append((labels.path(label), dist, time, flights - 1))
+            continue
+        if flights >= max_flights:
+            continue
+        mask = labels.mask[label]
+        for neighbor, km, minutes in zip(*graph.adjacency(airport)):
+            if (neighbor in sources and neighbor not in sinks) or (
+                    mask >> neighbor % MASK_BITS & 1 and labels.visited(label, neighbor)):
+                continue
+            new_dist = dist + km
+            if new_dist < best.get((neighbor, flights + 1), INF):
+                best[(neighbor, flights + 1)] = new_dist
+                heapq.heappush(heap, (new_dist, flights + 1, neighbor, labels.add(neighbor, label), time + minutes))
+    return found
+
+def find_nearby_alternatives(graph, departure, destination, stops=0, cabin="Economy", radius_km=NEARBY_RADIUS_KM):
+    # the departure and every airport near it against the destination and
+    # every airport near it, in one search
+    source = graph.ids.get(departure)
+    target = graph.ids.get(destination)
+    if source is None or target is None:
+        return []
+    sources = set(nearby_airports(graph, source, radius_km)) | {source}
+    sinks = set(nearby_airports(graph, target, radius_km)) | {target}
+    codes = graph.codes
+    multiplier = CABIN_MULTIPLIERS.get(cabin, 1.0)
+    found_routes = []
+    for path, dist, time, stops_used in multi_source_search(graph, sources, sinks, stops):
+        final_cost = round(calculate_cost(dist, stops_used) * multiplier, 2)
+        dist_to_destination = graph.great_circle_km(path[-1], target)
+        # None rather than NaN (invalid JSON) when either end has no coordinates
+        dist_to_destination = None if math.isnan(dist_to_destination) else round(dist_to_destination, 2)
+        found_routes.append(([codes[a] for a in path], dist, time, final_cost, cabin,
+                             "Alternative via Nearby Airport", dist_to_destination))
+    return found_routes
+
+def find_set_flights(graph, departures, destinations, stops=0, cabin="Economy", limit=50):
+    # departures / destinations are collections of airport ids, e.g. every
+    # airport in a country; one search instead of one per pair, with stops
+    # meaning intermediate airports exactly as in find_one_way_flights
+    codes = graph.codes
+    multiplier = CABIN_MULTIPLIERS.get(cabin, 1.0)
+    found_routes = []
+    for path, dist, time, stops_used in multi_source_search(graph, set(departures), set(destinations), stops, limit):
+        final_cost = round(calculate_cost(dist, stops_used) * multiplier, 2)
+        found_routes.append(([codes[a] for a in path], dist, time, final_cost, cabin, "Standard Route"))
+    return sort_routes_by_stops_and_price(found_routes)
 
 # Sorting algorithms
 def sort_routes_by_stops_and_price(routes):
@@ -91,30 +176,56 @@ def quicksort_routes_by_stops_and_distance(routes):
 # one-way flight algorithms
 def find_one_way_flights(graph, departure, destination, stops=0, cabin="Economy"):
     found_routes = []
-    queue = deque()
-    queue.append((departure, [departure], 0, 0))
+    codes = graph.codes
+    source = graph.ids.get(departure)
+    target = graph.ids.get(destination)
+    # breadth-first order is label order, so the label store doubles as the
+    # queue: labels below level_end have path length `length`, and distance
+    # and time live in arrays beside it
+    labels = LabelStore()
+    dists = array('l')
+    times = array('l')
+    if source is not None and target is not None:
+        # fewest flights from each airport to the destination, to drop
+        # branches that cannot arrive within the flights left
+        hops = reachability.hops_within(graph, target, stops + 1)
+        labels.add(source)
+        dists.append(0)
+        times.append(0)
     max_length = stops + 2
-    while queue:
-        current_airport, route_list, dist_so_far, time_so_far = queue.popleft()
-        if current_airport == destination and len(route_list) <= max_length and len(route_list) >= 2:
-            stops_so_far = len(route_list) - 2
+    add_airport, add_parent, add_mask = labels.airport.append, labels.parent.append, labels.mask.append
+    label = 0
+    length = 1
+    level_end = len(labels.airport)
+    while label < len(labels.airport):
+        if label == level_end:
+            length += 1
+            level_end = len(labels.airport)
+        current_airport = labels.airport[label]
+        dist_so_far, time_so_far = dists[label], times[label]
+        if current_airport == target and length <= max_length and length >= 2:
+            stops_so_far = length - 2
             base_cost = calculate_cost(dist_so_far, stops_so_far)
             cabin_multiplier = CABIN_MULTIPLIERS.get(cabin, 1.0)
             final_cost = round(base_cost * cabin_multiplier, 2)
-            found_routes.append((route_list, dist_so_far, time_so_far, final_cost, cabin, "Standard Route"))
-            continue
-        if len(route_list) < max_length:
-            for route in graph.get_routes(current_airport):
-                neighbor = route["destination"]
-                if neighbor in route_list:
+            found_routes.append(([codes[a] for a in labels.path(label)], dist_so_far, time_so_far, final_cost, cabin, "Standard Route"))
+        elif length < max_length:
+            mask = labels.mask[label]
+            flights_left = max_length - length - 1
+            for neighbor, km, minutes in zip(*graph.adjacency(current_airport)):
+                if hops[neighbor] > flights_left:
+                    continue
+                if mask >> neighbor % MASK_BITS & 1 and labels.visited(label, neighbor):
                     continue
-                new_dist = dist_so_far + route["km"]
-                new_time = time_so_far + route["min"]
-                new_route_list = route_list + [neighbor]
-                queue.append((neighbor, new_route_list, new_dist, new_time))
+                add_airport(neighbor)
+                add_parent(label)
+                add_mask(mask | 1 << neighbor % MASK_BITS)
+                dists.append(dist_so_far + km)
+                times.append(time_so_far + minutes)
+        label += 1
     if not found_routes:
         print("No direct flights available, looking into neighbouring airports.")
-        found_routes = assign_neighbour(graph, departure, destination, cabin)
+        found_routes = find_nearby_alternatives(graph, departure, destination, stops, cabin)
     # found_routes = quicksort_routes_by_stops_and_price(found_routes)
     found_routes = sort_routes_by_stops_and_price(found_routes)
     return found_routes
@@ -122,78 +233,94 @@ def find_one_way_flights(graph, departure, destination, stops=0, cabin="Economy"
 def find_one_way_flights_dijkstra(graph, departure, destination, stops=0, cabin="Economy"):
     found_routes = []
     max_stops = stops
+    codes = graph.codes
+    source = graph.ids.get(departure)
+    target = graph.ids.get(destination)
 
+    labels = LabelStore()
     heap = []
-    heapq.heappush(heap, (0, 0, departure, [departure], 0, 0))
-
-    best_distances = defaultdict(lambda: float('inf'))
-    best_distances[(departure, 0)] = 0
+    best_distances = {}
+    if source is not None and target is not None:
+        hops = reachability.hops_within(graph, target, max_stops + 1)
+        heapq.heappush(heap, (0, 0, source, labels.add(source), 0))
+        best_distances[(source, 0)] = 0
 
     while heap:
-        dist, stops_used, airport, path, path_dist, path_time = heapq.heappop(heap)
+        path_dist, stops_used, airport, label, path_time = heapq.heappop(heap)
 
-        if dist > best_distances[(airport, stops_used)]:
+        if path_dist > best_distances[(airport, stops_used)]:
             continue
 
-        if airport == destination and len(path) >= 2:
+        if airport == target and labels.parent[label] >= 0:
             base_cost = calculate_cost(path_dist, stops_used)
             final_cost = round(base_cost * CABIN_MULTIPLIERS.get(cabin, 1.0), 2)
-            found_routes.append((path, path_dist, path_time, final_cost, cabin, "Standard Route"))
+            found_routes.append(([codes[a] for a in labels.path(label)], path_dist, path_time, final_cost, cabin, "Standard Route"))
             continue
 
         if stops_used >= max_stops:
             continue
 
-        for route in graph.get_routes(airport):
-            neighbor = route["destination"]
-            if neighbor in path:
+        mask = labels.mask[label]
+        # a neighbour taken as a stop leaves max_stops - stops_used flights
+        flights_left = max_stops - stops_used
+        for neighbor, km, minutes in zip(*graph.adjacency(airport)):
+            if hops[neighbor] > flights_left:
                 continue
-            new_dist = path_dist + route["km"]
-            new_time = path_time + route["min"]
-            new_stops = stops_used + (0 if neighbor == destination else 1)
-            new_path = path + [neighbor]
-            if new_dist < best_distances[(neighbor, new_stops)]:
+            if mask >> neighbor % MASK_BITS & 1 and labels.visited(label, neighbor):
+                continue
+            new_dist = path_dist + km
+            new_time = path_time + minutes
+            new_stops = stops_used + (0 if neighbor == target else 1)
+            if new_dist < best_distances.get((neighbor, new_stops), INF):
                 best_distances[(neighbor, new_stops)] = new_dist
-                heapq.heappush(heap, (new_dist, new_stops, neighbor, new_path, new_dist, new_time))
+                heapq.heappush(heap, (new_dist, new_stops, neighbor, labels.add(neighbor, label), new_time))
 
     if not found_routes:
         print("No direct flights available, looking into neighbouring airports.")
-        found_routes = assign_neighbour(graph, departure, destination, cabin)
+        found_routes = find_nearby_alternatives(graph, departure, destination, stops, cabin)
 
     return found_routes
 
 def find_optimal_flights_complete(graph, departure, destination, max_stops=2, cabin="Economy"):
+    codes = graph.codes
+    source = graph.ids.get(departure)
+    target = graph.ids.get(destination)
+    labels = LabelStore()
     heap = []
-    heapq.heappush(heap, (0, 0, departure, [departure], 0))
-    best_dist = defaultdict(lambda: float('inf'))
-    best_dist[(departure, 0)] = 0
+    best_dist = {}
+    if source is not None and target is not None:
+        hops = reachability.hops_within(graph, target, max_stops + 1)
+        heapq.heappush(heap, (0, 0, source, labels.add(source), 0))
+        best_dist[(source, 0)] = 0
     found_routes = []
     found_direct = False
 
     while heap:
-        current_dist, stops, node, path, time = heapq.heappop(heap)
+        current_dist, stops, node, label, time = heapq.heappop(heap)
         if current_dist > best_dist[(node, stops)]:
             continue
-        if node == destination and len(path) >= 2:
+        if node == target and labels.parent[label] >= 0:
             cost = calculate_cost(current_dist, stops)
             final_cost = round(cost * CABIN_MULTIPLIERS.get(cabin, 1.0), 2)
-            found_routes.append((path, current_dist, time, final_cost, cabin, "Standard Route"))
+            found_routes.append(([codes[a] for a in labels.path(label)], current_dist, time, final_cost, cabin, "Standard Route"))
             if stops == 0:
                 found_direct = True
             continue
         if stops >= max_stops:
             continue
-        for route in graph.get_routes(node):
-            neighbor = route["destination"]
-            if neighbor in path:
+        mask = labels.mask[label]
+        flights_left = max_stops - stops
+        for neighbor, km, minutes in zip(*graph.adjacency(node)):
+            if hops[neighbor] > flights_left:
+                continue
+            if mask >> neighbor % MASK_BITS & 1 and labels.visited(label, neighbor):
                 continue
-            new_dist = current_dist + route["km"]
-            new_time = time + route["min"]
-            new_stops = stops + (1 if neighbor != destination else 0)
-            new_path = path + [neighbor]
-            if new_dist < best_dist[(neighbor, new_stops)]:
+            new_dist = current_dist + km
+            new_time = time + minutes
+            new_stops = stops + (1 if neighbor != target else 0)
+            if new_dist < best_dist.get((neighbor, new_stops), INF):
                 best_dist[(neighbor, new_stops)] = new_dist
-                heapq.heappush(heap, (new_dist, new_stops, neighbor, new_path, new_time))
+                heapq.heappush(heap, (new_dist, new_stops, neighbor, labels.add(neighbor, label), new_time))
 
     if max_stops == 0 and found_direct:
         return [route for route in found_routes if len(route[0]) == 2]
@@ -202,6 +329,175 @@ def find_optimal_flights_complete(graph, departure, destination, max_stops=2, ca
     found_routes.sort(key=lambda x: (len(x[0])-2, x[1]))
     return found_routes
 
+def find_best_flights_per_stops(graph, departure, destination, max_stops=2, cabin="Economy"):
+    # the shortest itinerary for each stop count that beats every itinerary
+    # with fewer stops, from the vectorised stop-layered Bellman-Ford
+    source = graph.ids.get(departure)
+    target = graph.ids.get(destination)
+    if source is None or target is None or source == target:
+        return []
+    dist, time, pred = bellmanFord.stop_layers(graph, source, max_stops)
+    codes = graph.codes
+    multiplier = CABIN_MULTIPLIERS.get(cabin, 1.0)
+    found_routes = []
+    for layer in range(1, max_stops + 2):
+        if pred[layer, target] < 0:
+            continue
+        path = bellmanFord.layer_path(graph, pred, layer, target)
+        distance = int(dist[layer, target])
+        final_cost = round(calculate_cost(distance, layer - 1) * multiplier, 2)
+        found_routes.append(([codes[a] for a in path], distance, int(time[layer, target]), final_cost, cabin, "Standard Route"))
+    return found_routes
+
+# k shortest loopless itineraries (Yen's algorithm)
+def shortest_flight_path(graph, source, target, max_flights, hops, banned_airports=(), banned_routes=()):
+    # hop-limited Dijkstra by distance; returns (km, minutes, path) or None
+    labels = LabelStore()
+    heap = [(0, 0, source, labels.add(source), 0)]
+    best = {(source, 0): 0}
+    while heap:
+        dist, flights, airport, label, time = heapq.heappop(heap)
+        if airport == target:
+            return dist, time, labels.path(label)
+        if dist > best[(airport, flights)]:
+            continue
+        flights_left = max_flights - flights - 1
+        for neighbor, km, minutes in zip(*graph.adjacency(airport)):
+            # a shortest hop-limited walk never repeats an airport, so no
+            # cycle check is needed beyond the banned root airports
+            if hops[neighbor] > flights_left or neighbor in banned_airports or (airport, neighbor) in banned_routes:
+                continue
+            new_dist = dist + km
+            if new_dist < best.get((neighbor, flights + 1), INF):
+                best[(neighbor, flights + 1)] = new_dist
+                heapq.heappush(heap, (new_dist, flights + 1, neighbor, labels.add(neighbor, label), time + minutes))
+    return None
+
+def route_legs(graph, path):
+    # km and minutes of each leg of a path of airport ids
+    legs = []
+    for u, v in zip(path, path[1:]):
+        dests, kms, minutes = graph.adjacency(u)
+        # parallel routes between the same pair keep the shortest
+        legs.append(min((km, m) for d, km, m in zip(dests, kms, minutes) if d == v))
+    return legs
+
+def k_shortest_paths(graph, source, target, max_flights, k):
+    # Yen: each new path deviates from an accepted one at some spur airport;
+    # only k accepted paths are ever expanded, so the work grows with k
+    # rather than with the number of paths within the stop limit
+    hops = reachability.hops_within(graph, target, max_flights)
+    if k <= 0 or source == target or hops[source] > max_flights:
+        return []
+    first = shortest_flight_path(graph, source, target, max_flights, hops)
+    if first is None:
+        return []
+    accepted = [first]
+    candidates = []
+    seen = {tuple(first[2])}
+    while len(accepted) < k:
+        previous = accepted[-1][2]
+        legs = route_legs(graph, previous)
+        root_dist = root_time = 0
+        for i in range(len(previous) - 1):
+            root = previous[:i + 1]
+            banned_routes = {(path[i], path[i + 1]) for dist, time, path in accepted
+                             if len(path) > i + 1 and path[:i + 1] == root}
+            spur = shortest_flight_path(graph, previous[i], target, max_flights - i, hops,
+                                        set(root[:-1]), banned_routes)
+            if spur is not None:
+                path = root[:-1] + spur[2]
+                if tuple(path) not in seen:
+                    seen.add(tuple(path))
+                    heapq.heappush(candidates, (root_dist + spur[0], len(path), path, root_time + spur[1]))
+            root_dist += legs[i][0]
+            root_time += legs[i][1]
+        if not candidates:
+            break
+        dist, length, path, time = heapq.heappop(candidates)
+        accepted.append((dist, time, path))
+    return accepted
+
+def find_k_shortest_flights(graph, departure, destination, stops=0, cabin="Economy", k=30):
+    if k <= 0:
+        return []
+    source = graph.ids.get(departure)
+    target = graph.ids.get(destination)
+    found_routes = []
+    if source is not None and target is not None:
+        codes = graph.codes
+        multiplier = CABIN_MULTIPLIERS.get(cabin, 1.0)
+        for dist, time, path in k_shortest_paths(graph, source, target, stops + 1, k):
+            final_cost = round(calculate_cost(dist, len(path) - 2) * multiplier, 2)
+            found_routes.append(([codes[a] for a in path], dist, time, final_cost, cabin, "Standard Route"))
+    if not found_routes:
+        print("No direct flights available, looking into neighbouring airports.")
+        found_routes = find_nearby_alternatives(graph, departure, destination, stops, cabin)
+    return found_routes
+
+# Pareto search over (distance, minutes, stops, price)
+def dominates(a, b):
+    # a, b are (distance, minutes, stops, price)
+    return a != b and all(x <= y for x, y in zip(a, b))
+
+def find_pareto_flights(graph, departure, destination, stops=0, cabin="Economy"):
+    # Label-setting search that keeps only non-dominated itineraries.
+    # Price is calculate_cost(distance, stops), and more stops are
+    # discounted, so labels with different flight counts never dominate one
+    # another on the way; within one (airport, flights) pair labels pop in
+    # (distance, minutes) order, so a label is dominated exactly when an
+    # earlier one there arrived no later.
+    source = graph.ids.get(departure)
+    target = graph.ids.get(destination)
+    if source is None or target is None or source == target:
+        return []
+    codes = graph.codes
+    multiplier = CABIN_MULTIPLIERS.get(cabin, 1.0)
+    max_flights = stops + 1
+    hops = reachability.hops_within(graph, target, max_flights)
+    # no itinerary is cheaper per km than the deepest stop discount; prices
+    # are rounded to cents, hence the one cent of slack below
+    cheapest_rate = calculate_cost(1000, 3) / 1000 * multiplier
+
+    labels = LabelStore()
+    heap = [(0, 0, 0, source, labels.add(source))]
+    earliest = {}
+    results = []
+    while heap:
+        dist, time, flights, airport, label = heapq.heappop(heap)
+        key = (airport, flights)
+        if earliest.get(key, INF) <= time:
+            continue
+        earliest[key] = time
+        if airport == target:
+            price = round(calculate_cost(dist, flights - 1) * multiplier, 2)
+            results.append(((dist, time, flights - 1, price), label))
+            continue
+        if flights == max_flights:
+            continue
+        mask = labels.mask[label]
+        flights_left = max_flights - flights - 1
+        for neighbor, km, minutes in zip(*graph.adjacency(airport)):
+            if hops[neighbor] > flights_left:
+                continue
+            if mask >> neighbor % MASK_BITS & 1 and labels.visited(label, neighbor):
+                continue
+            new_dist = dist + km
+            new_time = time + minutes
+            if earliest.get((neighbor, flights + 1), INF) <= new_time:
+                continue
+            # an itinerary already found that is no longer, slower or with
+            # fewer stops, and cheaper than any completion of this one, wins
+            if any(found[0] <= new_dist and found[1] <= new_time and found[2] <= flights
+                   and found[3] <= new_dist * cheapest_rate - 0.01 for found, found_label in results):
+                continue
+            heapq.heappush(heap, (new_dist, new_time, flights + 1, neighbor, labels.add(neighbor, label)))
+
+    frontier = [(criteria, label) for criteria, label in results
+                if not any(dominates(other, criteria) for other, other_label in results)]
+    return [([codes[a] for a in labels.path(label)], dist, time, price, cabin, "Standard Route")
+            for (dist, time, stops_used, price), label in frontier]
+
 # multi-city flight algorithms
 def find_multi_city_flights(graph, departure, middle, destination, max_stops = 1, filter_type='cheapest', cabin='Economy'):
     all_routes = []
@@ -230,42 +526,49 @@ def twoAirportDist(lat1, lon1, lat2, lon2):
     return ER * (2 * math.atan2(math.sqrt(a), math.sqrt(1 - a)))
 
 def remainingDistH(graph, from_iata, to_iata):
-    info1 = graph.get_airport_info(from_iata)
-    info2 = graph.get_airport_info(to_iata)
-    return twoAirportDist(float(info1['latitude']), float(info1['longitude']), float(info2['latitude']), float(info2['longitude']))
+    return graph.great_circle_km(graph.ids[from_iata], graph.ids[to_iata])
 
 def astar_search(graph, start, goal, cabin="Economy", max_stops=1):
+    codes = graph.codes
+    source = graph.ids.get(start)
+    target = graph.ids.get(goal)
+    labels = LabelStore()
     heap = []
-    heapq.heappush(heap, (0, 0, start, [start], 0, 0))
-    best = defaultdict(lambda: float('inf'))
-    best[(start, 0)] = 0
+    best = {}
+    if source is not None and target is not None:
+        heapq.heappush(heap, (0, 0, source, labels.add(source), 0, 0))
+        best[(source, 0)] = 0
+        remaining = geoDistance.heuristic_cache.get(graph, target)
+        hops = reachability.hops_within(graph, target, max_stops + 1)
     results = []
 
     while heap:
-        f_score, stops, node, path, dist, duration = heapq.heappop(heap)
+        f_score, stops, node, label, dist, duration = heapq.heappop(heap)
 
-        if node == goal and len(path) >= 2:
-            stops_so_far = len(path) - 2
+        # stops counts flights taken so far
+        if node == target and stops >= 1:
+            stops_so_far = stops - 1
             base_cost = calculate_cost(dist, stops_so_far)
             final_cost = round(base_cost * CABIN_MULTIPLIERS.get(cabin, 1.0), 2)
-            results.append((path, dist, duration, final_cost, cabin, "Standard Route"))
+            results.append(([codes[a] for a in labels.path(label)], dist, duration, final_cost, cabin, "Standard Route"))
             continue
 
         if stops >= max_stops + 1:
             continue
 
-        for route in graph.get_routes(node):
-            neighbor = route['destination']
-            if neighbor in path:
+        mask = labels.mask[label]
+        flights_left = max_stops - stops
+        for neighbor, km, minutes in zip(*graph.adjacency(node)):
+            if hops[neighbor] > flights_left:
+                continue
+            if mask >> neighbor % MASK_BITS & 1 and labels.visited(label, neighbor):
                 continue
-            d = dist + route['km']
-            t = duration + route['min']
-            new_path = path + [neighbor]
-            h = remainingDistH(graph, neighbor, goal)
-            f = d + h
-            if f < best[(neighbor, stops + 1)]:
+            d = dist + km
+            t = duration + minutes
+            f = d + remaining[neighbor]
+            if f < best.get((neighbor, stops + 1), INF):
                 best[(neighbor, stops + 1)] = f
-                heapq.heappush(heap, (f, stops + 1, neighbor, new_path, d, t))
+                heapq.heappush(heap, (f, stops + 1, neighbor, labels.add(neighbor, label), d, t))
 
     return results
 
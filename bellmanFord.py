@@ -0,0 +1,71 @@
+import numpy as np
+
+from reachability import GraphCache
+
+# Stop-bounded Bellman-Ford over the whole CSR edge list at once. Round L
+# relaxes every route in one vectorised pass, so layer L holds the best
+# distance using at most L flights (L - 1 stops) for every airport, with
+# no heap and no per-path Python objects.
+
+
+def edge_arrays(graph):
+    # (src, dest, km, minutes) as NumPy arrays, one entry per route
+    n = len(graph.codes)
+    if graph.dest is not None:
+        counts = np.diff(np.asarray(graph.offsets, dtype=np.int64))
+        dest = np.asarray(graph.dest, dtype=np.int64)
+        km = np.asarray(graph.km, dtype=np.int64)
+        minutes = np.asarray(graph.minutes, dtype=np.int64)
+    else:
+        # compressed / sqlite storage: gather the rows through adjacency()
+        rows = [graph.adjacency(u) for u in range(n)]
+        counts = np.array([len(row[0]) for row in rows], dtype=np.int64)
+        dest = np.fromiter((v for row in rows for v in row[0]), dtype=np.int64, count=int(counts.sum()))
+        km = np.fromiter((v for row in rows for v in row[1]), dtype=np.int64, count=len(dest))
+        minutes = np.fromiter((v for row in rows for v in row[2]), dtype=np.int64, count=len(dest))
+    src = np.repeat(np.arange(n, dtype=np.int64), counts)
+    return src, dest, km, minutes
+
+
+edge_cache = GraphCache(edge_arrays, max_entries=1)
+
+
+def stop_layers(graph, source, max_stops):
+    # dist[L, v], time[L, v] and pred[L, v] for L = 0 .. max_stops + 1 flights.
+    # pred is the route index whose relaxation improved v in round L, or -1
+    # when layer L just carries layer L - 1 over. A strict improvement can
+    # only come from a path of exactly L flights, and such a best path never
+    # repeats an airport (dropping the loop would beat layer L - 1).
+    src, dest, km, minutes = edge_cache.get(graph)
+    n = len(graph.codes)
+    layers = max_stops + 2
+    dist = np.full((layers, n), np.inf)
+    time = np.zeros((layers, n), dtype=np.int64)
+    pred = np.full((layers, n), -1, dtype=np.int64)
+    dist[0, source] = 0
+    edges = np.arange(len(dest))
+    for layer in range(1, layers):
+        previous = dist[layer - 1]
+        candidate = previous[src] + km
+        relaxed = previous.copy()
+        np.minimum.at(relaxed, dest, candidate)
+        improved = (candidate == relaxed[dest]) & (candidate < previous[dest])
+        pred[layer, dest[improved]] = edges[improved]
+        chosen = pred[layer] >= 0
+        dist[layer] = relaxed
+        time[layer] = time[layer - 1]
+        time[layer, chosen] = time[layer - 1, src[pred[layer, chosen]]] + minutes[pred[layer, chosen]]
+    return dist, time, pred
+
+
+def layer_path(graph, pred, layer, airport):
+    src = edge_cache.get(graph)[0]
+    path = [airport]
+    while layer > 0:
+        edge = pred[layer, airport]
+        if edge >= 0:
+            airport = int(src[edge])
+            path.append(airport)
+        layer -= 1
+    path.reverse()
+    return path
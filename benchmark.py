@@ -0,0 +1,110 @@
+import io
+import json
+import random
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+import algorithms
+import compressedGraph
+import dataParser
+import sqliteGraph
+
+DATASET = 'dataset/airline_routes.json'
+
+
+def measure(label, build):
+    # time and memory come from separate runs, tracemalloc slows builds down a lot
+    start_time = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start_time
+    tracemalloc.start()
+    graph = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed:8.3f} s   peak {peak / 2**20:8.1f} MiB   retained {current / 2**20:8.1f} MiB")
+    return graph
+
+
+def json_load_build(path):
+    with open(path) as f:
+        data = json.load(f)
+    return dataParser.AirportGraph(data)
+
+
+def compare_loaders(path=DATASET):
+    print(f"Loading {path}")
+    measure("json.load + build_graph", lambda: json_load_build(path))
+    measure("streaming load_airports", lambda: dataParser.load_airport_graph(path))
+
+
+def sample_pairs(graph, count=50, seed=7):
+    rng = random.Random(seed)
+    codes = [iata for iata in graph.codes if iata in graph.airport_info]
+    return [(rng.choice(codes), rng.choice(codes)) for _ in range(count)]
+
+
+def time_searches(graph, pairs, stops=2):
+    start_time = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        for departure, destination in pairs:
+            algorithms.find_one_way_flights_dijkstra(graph, departure, destination, stops)
+    return time.perf_counter() - start_time
+
+
+def time_edge_scan(graph, rounds=3):
+    start_time = time.perf_counter()
+    for _ in range(rounds):
+        for airport in range(len(graph.codes)):
+            for v, km, minutes in zip(*graph.adjacency(airport)):
+                pass
+    return time.perf_counter() - start_time
+
+
+def compare_storage(path=DATASET):
+    graph = dataParser.load_airport_graph(path)
+    pairs = sample_pairs(graph)
+    variants = [
+        ("CSR arrays", graph),
+        ("compressed", compressedGraph.CompressedAirportGraph(graph)),
+        ("compressed, no cache", compressedGraph.CompressedAirportGraph(graph, cache_blocks=0)),
+        ("compressed, 5 km / 5 min", compressedGraph.CompressedAirportGraph(graph, 5, 5)),
+    ]
+    edges = len(graph.dest)
+    print(f"{len(graph.codes)} airports, {edges} routes")
+    for label, variant in variants:
+        size = variant.memory_bytes()
+        print(f"{label:<28} {size / 2**20:7.2f} MiB  {size / edges:6.1f} B/route   "
+              f"edge scan {time_edge_scan(variant):6.3f} s   searches {time_searches(variant, pairs):6.3f} s")
+
+
+def compare_sqlite(path=DATASET, sqlite_path='dataset/airline_routes.sqlite'):
+    graph = dataParser.load_airport_graph(path)
+    sqliteGraph.write_sqlite(graph, sqlite_path)
+    pairs = sample_pairs(graph)
+    edges = len(graph.dest)
+    print(f"{len(graph.codes)} airports, {edges} routes")
+    size = graph.memory_bytes()
+    print(f"{'in-memory CSR':<28} {size / 2**20:7.2f} MiB  {size / edges:6.1f} B/route   "
+          f"edge scan {time_edge_scan(graph):6.3f} s   searches {time_searches(graph, pairs):6.3f} s")
+    for page_cache in (0, 256, 4096):
+        variant = sqliteGraph.SqliteAirportGraph(sqlite_path, page_cache)
+        scan = time_edge_scan(variant)
+        searches = time_searches(variant, pairs)
+        # measured after the runs, once the row cache is as full as it gets
+        size = variant.memory_bytes()
+        print(f"{f'sqlite, {page_cache} cached rows':<28} {size / 2**20:7.2f} MiB  {size / edges:6.1f} B/route   "
+              f"edge scan {scan:6.3f} s   searches {searches:6.3f} s   "
+              f"cache hits {variant.cache_hits} misses {variant.cache_misses}")
+
+
+BENCHMARKS = {
+    "load": compare_loaders,
+    "storage": compare_storage,
+    "sqlite": compare_sqlite,
+}
+
+if __name__ == '__main__':
+    name = sys.argv[1] if len(sys.argv) > 1 else "load"
+    BENCHMARKS[name](*sys.argv[2:])
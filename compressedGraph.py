@@ -0,0 +1,204 @@
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+
+from dataParser import AirportGraph
+
+
+def encode_varints(values, out):
+    for value in values:
+        while value >= 0x80:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        out.append(value)
+
+
+def decode_varints(blob, pos, count):
+    values = []
+    for _ in range(count):
+        value = 0
+        shift = 0
+        while True:
+            byte = blob[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        values.append(value)
+    return values, pos
+
+
+class CompressedAirportGraph(AirportGraph):
+    # Read-only variant of AirportGraph for route networks too large for the
+    # plain CSR arrays. Each airport's routes are sorted by destination id and
+    # stored as one block in a shared byte blob: varint destination deltas,
+    # then varint km / km_quantum, then varint minutes / minute_quantum.
+    # Carriers and the incoming-route index get their own blobs with the same
+    # per-airport block layout. adjacency() decodes a whole block at once; the
+    # most recently decoded blocks are cached because hubs are expanded often.
+    def __init__(self, graph, km_quantum=1, minute_quantum=1, cache_blocks=256):
+        super().__init__({})
+        self.version = graph.version
+        self.ids = graph.ids
+        self.codes = graph.codes
+        self.airport_info = graph.airport_info
+        for name in ("latitude", "longitude", "lat_rad", "lon_rad", "sin_lat", "cos_lat"):
+            setattr(self, name, getattr(graph, name))
+        self.carrier_registry = graph.carrier_registry
+        self.geometry_cache = graph.geometry_cache
+        self.density_layers = graph.density_layers
+        self.km_quantum = km_quantum
+        self.minute_quantum = minute_quantum
+        self.cache_blocks = cache_blocks
+        self.block_cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.compress(graph)
+        self.dest = self.km = self.minutes = None
+        self.carrier_offsets = self.carrier_ids = self.in_src = self.in_edge = None
+
+    def compress(self, graph):
+        blob = bytearray()
+        block_offsets = array('l', [0])
+        carrier_blob = bytearray()
+        carrier_block_offsets = array('l', [0])
+        position_in_row = array('l', [0]) * len(graph.dest)
+        for u in range(len(graph.codes)):
+            start, end = graph.offsets[u], graph.offsets[u + 1]
+            order = sorted(range(start, end), key=graph.dest.__getitem__)
+            dest = [graph.dest[e] for e in order]
+            encode_varints([b - a for a, b in zip([0] + dest, dest)], blob)
+            encode_varints([round(graph.km[e] / self.km_quantum) for e in order], blob)
+            encode_varints([round(graph.minutes[e] / self.minute_quantum) for e in order], blob)
+            block_offsets.append(len(blob))
+
+            counts = []
+            carriers = []
+            for position, e in enumerate(order):
+                position_in_row[e] = position
+                row = graph.carrier_ids[graph.carrier_offsets[e]:graph.carrier_offsets[e + 1]]
+                counts.append(len(row))
+                carriers.extend(row)
+            encode_varints(counts, carrier_blob)
+            encode_varints(carriers, carrier_blob)
+            carrier_block_offsets.append(len(carrier_blob))
+
+        in_blob = bytearray()
+        in_block_offsets = array('l', [0])
+        for v in range(len(graph.codes)):
+            start, end = graph.in_offsets[v], graph.in_offsets[v + 1]
+            entries = sorted((graph.in_src[i], position_in_row[graph.in_edge[i]]) for i in range(start, end))
+            sources = [source for source, position in entries]
+            encode_varints([b - a for a, b in zip([0] + sources, sources)], in_blob)
+            encode_varints([position for source, position in entries], in_blob)
+            in_block_offsets.append(len(in_blob))
+
+        self.offsets = array('l', graph.offsets)
+        self.blob = bytes(blob)
+        self.block_offsets = block_offsets
+        self.carrier_blob = bytes(carrier_blob)
+        self.carrier_block_offsets = carrier_block_offsets
+        self.in_offsets = array('l', graph.in_offsets)
+        self.in_blob = bytes(in_blob)
+        self.in_block_offsets = in_block_offsets
+
+    def decode_block(self, airport):
+        count = self.offsets[airport + 1] - self.offsets[airport]
+        deltas, pos = decode_varints(self.blob, self.block_offsets[airport], count)
+        km, pos = decode_varints(self.blob, pos, count)
+        minutes, pos = decode_varints(self.blob, pos, count)
+        if self.km_quantum != 1:
+            km = [value * self.km_quantum for value in km]
+        if self.minute_quantum != 1:
+            minutes = [value * self.minute_quantum for value in minutes]
+        return list(accumulate(deltas)), km, minutes
+
+    def decode_carriers(self, airport):
+        count = self.offsets[airport + 1] - self.offsets[airport]
+        counts, pos = decode_varints(self.carrier_blob, self.carrier_block_offsets[airport], count)
+        carriers, pos = decode_varints(self.carrier_blob, pos, sum(counts))
+        rows = []
+        start = 0
+        for n in counts:
+            rows.append(carriers[start:start + n])
+            start += n
+        return rows
+
+    def adjacency(self, airport):
+        with self.lock:
+            block = self.block_cache.get(airport)
+            if block is not None:
+                self.block_cache.move_to_end(airport)
+                return block
+        block = self.decode_block(airport)
+        if self.cache_blocks:
+            with self.lock:
+                self.block_cache[airport] = block
+                if len(self.block_cache) > self.cache_blocks:
+                    self.block_cache.popitem(last=False)
+        return block
+
+    def incoming_adjacency(self, airport):
+        count = self.in_offsets[airport + 1] - self.in_offsets[airport]
+        deltas, pos = decode_varints(self.in_blob, self.in_block_offsets[airport], count)
+        positions, pos = decode_varints(self.in_blob, pos, count)
+        sources = list(accumulate(deltas))
+        return sources, [self.offsets[source] + position for source, position in zip(sources, positions)]
+
+    def edge_carriers(self, edge):
+        airport = bisect_right(self.offsets, edge) - 1
+        names = self.carrier_registry.names
+        return [names[c] for c in self.decode_carriers(airport)[edge - self.offsets[airport]]]
+
+    def route_carrier_counts(self, airport):
+        count = self.offsets[airport + 1] - self.offsets[airport]
+        return decode_varints(self.carrier_blob, self.carrier_block_offsets[airport], count)[0]
+
+    def has_carrier(self, edge, name):
+        return name in self.edge_carriers(edge)
+
+    def get_routes(self, iata):
+        airport = self.ids.get(iata)
+        if airport is None:
+            return []
+        names = self.carrier_registry.names
+        dest, km, minutes = self.adjacency(airport)
+        carriers = self.decode_carriers(airport)
+        return [{
+            "destination": self.codes[dest[i]],
+            "km": km[i],
+            "min": minutes[i],
+            "carriers": [names[c] for c in carriers[i]]
+        } for i in range(len(dest))]
+
+    def get_incoming_routes(self, iata):
+        airport = self.ids.get(iata)
+        if airport is None:
+            return []
+        routes = []
+        for origin, edge in zip(*self.incoming_adjacency(airport)):
+            dest, km, minutes = self.adjacency(origin)
+            position = edge - self.offsets[origin]
+            routes.append({
+                "origin": self.codes[origin],
+                "km": km[position],
+                "min": minutes[position],
+                "carriers": self.edge_carriers(edge)
+            })
+        return routes
+
+    def memory_bytes(self):
+        columns = (self.offsets, self.block_offsets, self.carrier_block_offsets, self.in_offsets, self.in_block_offsets)
+        return (len(self.blob) + len(self.carrier_blob) + len(self.in_blob) +
+                sum(len(column) * column.itemsize for column in columns))
+
+    def add_airport(self, iata, name, country, country_code, latitude, longitude):
+        raise TypeError("compressed graphs are read-only, update the source graph and recompress")
+
+    def add_route(self, from_iata, to_iata, km, minutes, carriers):
+        raise TypeError("compressed graphs are read-only, update the source graph and recompress")
+
+    def copy(self):
+        raise TypeError("compressed graphs are read-only, update the source graph and recompress")
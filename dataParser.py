@@ -1,90 +1,572 @@
+import json
+import math
+import threading
+from array import array
+from collections.abc import Mapping
+
+import routeDensity
+import routeGeometry
+from spatialIndex import GridIndex, SpatialIndex, chord_to_km, km_to_chord, unit_vector
+
+EARTH_RADIUS_KM = 6378
+
+
+class RouteTable(Mapping):
+    # read-only iata -> [route dict] view over the CSR arrays, so code that
+    # used to walk graph.graph directly keeps working. Like the old dict it
+    # only holds the dataset's airports, not those only seen as destinations.
+    def __init__(self, airport_graph):
+        self.airport_graph = airport_graph
+
+    def __getitem__(self, iata):
+        if iata not in self.airport_graph.airport_info:
+            raise KeyError(iata)
+        return self.airport_graph.get_routes(iata)
+
+    def __iter__(self):
+        return iter(self.airport_graph.airport_info)
+
+    def __len__(self):
+        return len(self.airport_graph.airport_info)
+
+
+class Airport:
+    # slotted airport record; supports info["field"] so it can stand in for
+    # the per-airport dicts airport_info used to hold
+    __slots__ = ("iata", "name", "country", "country_code", "latitude", "longitude")
+
+    def __init__(self, iata, name, country, country_code, latitude, longitude):
+        self.iata = iata
+        self.name = name
+        self.country = country
+        self.country_code = country_code
+        self.latitude = latitude
+        self.longitude = longitude
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+
+class CarrierRegistry:
+    # interns carrier names so edges only carry small integer ids
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name):
+        carrier = self.ids.get(name)
+        if carrier is None:
+            carrier = len(self.names)
+            self.ids[name] = carrier
+            self.names.append(name)
+        return carrier
+
+    def get_id(self, name):
+        return self.ids.get(name)
+
+    def get_name(self, carrier):
+        return self.names[carrier]
+
+
+carrier_registry = CarrierRegistry()
+
+
 class AirportGraph:
+    # Routes are stored in compressed sparse row form: airport u owns the
+    # edges offsets[u]:offsets[u + 1] of the parallel dest/km/minutes arrays.
+    # Carriers of edge e are carrier_ids[carrier_offsets[e]:carrier_offsets[e + 1]],
+    # ids into the shared carrier registry.
+    # The incoming index mirrors this: airport v's incoming routes are
+    # in_offsets[v]:in_offsets[v + 1] of in_src (the origin) and in_edge (the
+    # forward edge, so km/minutes/carriers are not duplicated).
+    # Coordinates are parsed once into per-id arrays (degrees, radians, and
+    # the latitude sine/cosine) so distance code never touches strings.
     def __init__(self, data):
-        self.graph = {}
+        self.version = 0
+        self.ids = {}
+        self.codes = []
         self.airport_info = {}
+        self.latitude = array('d')
+        self.longitude = array('d')
+        self.lat_rad = array('d')
+        self.lon_rad = array('d')
+        self.sin_lat = array('d')
+        self.cos_lat = array('d')
+        self.offsets = array('l', [0])
+        self.dest = array('i')
+        self.km = array('i')
+        self.minutes = array('i')
+        self.carrier_registry = carrier_registry
+        self.carrier_offsets = array('l', [0])
+        self.carrier_ids = array('H')
+        self.in_offsets = array('l', [0])
+        self.in_src = array('i')
+        self.in_edge = array('l')
+        self.spatial_index = None
+        self.grid_index = None
+        self.density_layers = None
+        self.country_index = None
+        # (u, v) -> encoded polylines, filled on first use; a graph mapped
+        # from a snapshot also has them precomputed per edge in
+        # geometry[geometry_offsets[e]:geometry_offsets[e + 1]]
+        self.geometry_cache = {}
+        self.geometry_offsets = None
+        self.geometry = None
+        self.graph = RouteTable(self)
         self.build_graph(data)
-    
+
     def build_graph(self, data):
-        for iata, airport in data.items():
-            self.airport_info[iata] = {
-                "name": airport["name"],
-                "country": airport["country"],
-                "country_code": airport["country_code"],
-                "latitude": airport["latitude"],
-                "longitude": airport["longitude"]
-            }
-            self.graph[iata] = []
+        self.load_airports(data.items())
+
+    def load_airports(self, airports):
+        # single pass over (iata, airport) pairs: routes are staged in typed
+        # arrays in arrival order and bucketed into the CSR rows at the end
+        src = array('i')
+        dst = array('i')
+        km = array('i')
+        minutes = array('i')
+        carrier_offsets = array('l', [0])
+        carrier_ids = array('H')
+        intern = self.carrier_registry.intern
+        for iata, airport in airports:
+            self.add_airport(iata, airport["name"], airport["country"], airport["country_code"],
+                             airport["latitude"], airport["longitude"])
+            u = self.ids[iata]
             for route in airport.get("routes", []):
-                carriers = [carrier["name"] for carrier in route.get("carriers", [])]
-                self.graph[iata].append({
-                    "destination": route["iata"],
-                    "km": route["km"],
-                    "min": route["min"],
-                    "carriers": carriers
-                })
-    
+                src.append(u)
+                dst.append(self.airport_id(route["iata"]))
+                km.append(route["km"])
+                minutes.append(route["min"])
+                carrier_ids.extend([intern(carrier["name"]) for carrier in route.get("carriers", [])])
+                carrier_offsets.append(len(carrier_ids))
+        self.merge_edges(src, dst, km, minutes, carrier_offsets, carrier_ids)
+        self.spatial_index = None
+        self.grid_index = None
+        self.density_layers = None
+        self.country_index = None
+
+    def merge_edges(self, src, dst, km, minutes, carrier_offsets, carrier_ids):
+        n = len(self.codes)
+        starts = [0] * (n + 1)
+        for u in src:
+            starts[u + 1] += 1
+        for u in range(n):
+            starts[u + 1] += starts[u]
+        order = array('l', [0]) * len(src)
+        fill = starts[:]
+        for i, u in enumerate(src):
+            order[fill[u]] = i
+            fill[u] += 1
+
+        new_offsets = array('l', [0])
+        new_dest = array('i')
+        new_km = array('i')
+        new_minutes = array('i')
+        new_carrier_offsets = array('l', [0])
+        new_carrier_ids = array('H')
+        for u in range(n):
+            start, end = self.offsets[u], self.offsets[u + 1]
+            new_dest.extend(self.dest[start:end])
+            new_km.extend(self.km[start:end])
+            new_minutes.extend(self.minutes[start:end])
+            for e in range(start, end):
+                new_carrier_ids.extend(self.carrier_ids[self.carrier_offsets[e]:self.carrier_offsets[e + 1]])
+                new_carrier_offsets.append(len(new_carrier_ids))
+            for i in order[starts[u]:starts[u + 1]]:
+                new_dest.append(dst[i])
+                new_km.append(km[i])
+                new_minutes.append(minutes[i])
+                new_carrier_ids.extend(carrier_ids[carrier_offsets[i]:carrier_offsets[i + 1]])
+                new_carrier_offsets.append(len(new_carrier_ids))
+            new_offsets.append(len(new_dest))
+        self.offsets, self.dest, self.km, self.minutes = new_offsets, new_dest, new_km, new_minutes
+        self.carrier_offsets, self.carrier_ids = new_carrier_offsets, new_carrier_ids
+        self.build_incoming_index()
+
+    def build_incoming_index(self):
+        n = len(self.codes)
+        counts = [0] * (n + 1)
+        for v in self.dest:
+            counts[v + 1] += 1
+        for v in range(n):
+            counts[v + 1] += counts[v]
+        in_src = array('i', [0]) * len(self.dest)
+        in_edge = array('l', [0]) * len(self.dest)
+        fill = counts[:]
+        for u in range(n):
+            for e in range(self.offsets[u], self.offsets[u + 1]):
+                v = self.dest[e]
+                in_src[fill[v]] = u
+                in_edge[fill[v]] = e
+                fill[v] += 1
+        self.in_offsets, self.in_src, self.in_edge = array('l', counts), in_src, in_edge
+
+    def copy(self):
+        graph = AirportGraph({})
+        graph.version = self.version
+        graph.ids = dict(self.ids)
+        graph.codes = list(self.codes)
+        graph.airport_info = dict(self.airport_info)
+        for name in ("latitude", "longitude", "lat_rad", "lon_rad", "sin_lat", "cos_lat",
+                     "offsets", "dest", "km", "minutes", "carrier_offsets", "carrier_ids",
+                     "in_offsets", "in_src", "in_edge"):
+            column = getattr(self, name)
+            typecode = column.typecode if isinstance(column, array) else getattr(graph, name).typecode
+            setattr(graph, name, array(typecode, column))
+        graph.carrier_registry = self.carrier_registry
+        # keyed by airport pair and coordinates never change, so it stays valid
+        graph.geometry_cache = self.geometry_cache
+        return graph
+
+    def make_writable(self):
+        # a graph loaded from a snapshot points at read-only mapped memory;
+        # copy it into private arrays before the first mutation
+        if not isinstance(self.offsets, array):
+            self.offsets = array('l', self.offsets)
+            self.dest = array('i', self.dest)
+            self.km = array('i', self.km)
+            self.minutes = array('i', self.minutes)
+            self.carrier_offsets = array('l', self.carrier_offsets)
+            self.carrier_ids = array('H', self.carrier_ids)
+            self.in_offsets = array('l', self.in_offsets)
+            self.in_src = array('i', self.in_src)
+            self.in_edge = array('l', self.in_edge)
+        if not isinstance(self.latitude, array):
+            self.latitude = array('d', self.latitude)
+            self.longitude = array('d', self.longitude)
+
+    def airport_id(self, iata):
+        airport = self.ids.get(iata)
+        if airport is None:
+            self.make_writable()
+            airport = len(self.codes)
+            self.ids[iata] = airport
+            self.codes.append(iata)
+            self.offsets.append(self.offsets[-1])
+            self.in_offsets.append(self.in_offsets[-1])
+            for column in (self.latitude, self.longitude, self.lat_rad, self.lon_rad, self.sin_lat, self.cos_lat):
+                column.append(math.nan)
+        return airport
+
     def add_airport(self, iata, name, country, country_code, latitude, longitude):
-        if iata not in self.graph:
-            self.graph[iata] = []
-            self.airport_info[iata] = {
-                "name": name,
-                "country": country,
-                "country_code": country_code,
-                "latitude": latitude,
-                "longitude": longitude
-            }
-    
-    def add_route(self, from_iata, to_iata, km, minutes, carriers):
-        if from_iata in self.graph:
-            self.graph[from_iata].append({
-                "destination": to_iata,
-                "km": km,
-                "min": minutes,
-                "carriers": carriers
-            })
+        if iata not in self.airport_info:
+            airport = self.airport_id(iata)
+            latitude = float(latitude)
+            longitude = float(longitude)
+            self.airport_info[iata] = Airport(iata, name, country, country_code, latitude, longitude)
+            self.latitude[airport] = latitude
+            self.longitude[airport] = longitude
+            self.set_trig(airport)
+            if self.spatial_index is not None:
+                self.spatial_index.add(airport, *self.unit_vector(airport))
+            if self.grid_index is not None:
+                self.grid_index.add(airport, latitude, longitude)
+            if self.country_index is not None:
+                self.country_index.setdefault(country_code, []).append(airport)
+
+    def set_trig(self, airport):
+        lat = math.radians(self.latitude[airport])
+        self.lat_rad[airport] = lat
+        self.lon_rad[airport] = math.radians(self.longitude[airport])
+        self.sin_lat[airport] = math.sin(lat)
+        self.cos_lat[airport] = math.cos(lat)
+
+    def unit_vector(self, airport):
+        cos_lat = self.cos_lat[airport]
+        lon = self.lon_rad[airport]
+        return cos_lat * math.cos(lon), cos_lat * math.sin(lon), self.sin_lat[airport]
+
+    def get_spatial_index(self):
+        # built on first use after a load, then kept in sync by add_airport
+        if self.spatial_index is None:
+            self.spatial_index = SpatialIndex((airport, *self.unit_vector(airport))
+                                              for airport in range(len(self.codes))
+                                              if not math.isnan(self.lat_rad[airport]))
+        return self.spatial_index
+
+    def get_grid_index(self):
+        if self.grid_index is None:
+            self.grid_index = GridIndex((airport, self.latitude[airport], self.longitude[airport])
+                                        for airport in range(len(self.codes))
+                                        if not math.isnan(self.latitude[airport]))
+        return self.grid_index
+
+    def airports_in_box(self, south, west, north, east):
+        return [self.codes[airport] for airport in self.get_grid_index().in_box(south, west, north, east)]
+
+    def get_country_index(self):
+        # country_code -> airport ids
+        if self.country_index is None:
+            index = {}
+            ids = self.ids
+            for iata, info in self.airport_info.items():
+                index.setdefault(info.country_code, []).append(ids[iata])
+            self.country_index = index
+        return self.country_index
+
+    def airports_in_country(self, country_code):
+        return self.get_country_index().get(country_code, [])
+
+    def resolve_airports(self, spec):
+        # "SIN", "NRT,HND,KIX", "country:JP" or "near:LAT,LON,KM" -> airport ids
+        if spec.startswith("country:"):
+            airports = self.airports_in_country(spec[len("country:"):])
+        elif spec.startswith("near:"):
+            try:
+                latitude, longitude, radius_km = (float(part) for part in spec[len("near:"):].split(","))
+            except ValueError:
+                raise ValueError(f"expected near:LAT,LON,KM, got {spec!r}")
+            airports = [self.ids[iata] for iata, distance in self.airports_within(latitude, longitude, radius_km)]
         else:
-            self.graph[from_iata] = [{
-                "destination": to_iata,
-                "km": km,
-                "min": minutes,
-                "carriers": carriers
-            }]
-    
+            airports = [self.ids[iata] for iata in spec.split(",") if iata in self.ids]
+        if not airports:
+            raise ValueError(f"no airports match {spec!r}")
+        return airports
+
+    def get_density_layers(self):
+        # zoom -> routeDensity.DensityLayer, rebuilt after the routes change
+        if self.density_layers is None:
+            self.density_layers = routeDensity.build_layers(self)
+        return self.density_layers
+
+    def density_layer(self, zoom):
+        zoom, cell_degrees = routeDensity.level_for_zoom(zoom)
+        return self.get_density_layers()[zoom]
+
+    def route_geometry(self, u, v):
+        # only real routes get geometry, so the cache is bounded by the edges
+        parts = self.geometry_cache.get((u, v))
+        if parts is not None:
+            return parts
+        if math.isnan(self.latitude[u]) or math.isnan(self.latitude[v]):
+            return []
+        row = list(self.adjacency(u)[0])
+        if v not in row:
+            return []
+        if self.geometry is not None:
+            e = self.offsets[u] + row.index(v)
+            parts = bytes(self.geometry[self.geometry_offsets[e]:self.geometry_offsets[e + 1]]).decode('ascii').split(' ')
+        else:
+            parts = routeGeometry.leg_polylines(self.latitude[u], self.longitude[u],
+                                                self.latitude[v], self.longitude[v])
+        self.geometry_cache[(u, v)] = parts
+        return parts
+
+    def path_geometry(self, path):
+        # one list of encoded polylines per leg of a path of IATA codes,
+        # empty for legs that are not routes in the graph
+        ids = [self.ids.get(iata) for iata in path]
+        return [self.route_geometry(u, v) if u is not None and v is not None else []
+                for u, v in zip(ids, ids[1:])]
+
+    def airport_filter(self, country_code=None, min_routes=0):
+        if country_code is None and not min_routes:
+            return None
+        offsets = self.offsets
+
+        def accept(airport):
+            if country_code is not None and self.airport_info[self.codes[airport]].country_code != country_code:
+                return False
+            return offsets[airport + 1] - offsets[airport] >= min_routes
+        return accept
+
+    def airports_within(self, latitude, longitude, radius_km, country_code=None, min_routes=0):
+        found = self.get_spatial_index().within(unit_vector(latitude, longitude), km_to_chord(radius_km),
+                                                self.airport_filter(country_code, min_routes))
+        return [(self.codes[airport], chord_to_km(math.sqrt(d2))) for d2, airport in sorted(found)]
+
+    def nearest_airports(self, latitude, longitude, k=5, country_code=None, min_routes=0):
+        found = self.get_spatial_index().nearest(unit_vector(latitude, longitude), k,
+                                                 self.airport_filter(country_code, min_routes))
+        return [(self.codes[airport], chord_to_km(math.sqrt(d2))) for d2, airport in found]
+
+    def great_circle_km(self, a, b):
+        cos_lat = self.cos_lat
+        sin_dlat = math.sin((self.lat_rad[b] - self.lat_rad[a]) / 2)
+        sin_dlon = math.sin((self.lon_rad[b] - self.lon_rad[a]) / 2)
+        h = sin_dlat * sin_dlat + cos_lat[a] * cos_lat[b] * sin_dlon * sin_dlon
+        return EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(h), math.sqrt(1 - h))
+
+    def add_route(self, from_iata, to_iata, km, minutes, carriers):
+        u = self.airport_id(from_iata)
+        v = self.airport_id(to_iata)
+        self.make_writable()
+        # precomputed geometry is indexed by edge and the edges are about to shift
+        self.geometry_offsets = self.geometry = None
+        end = self.offsets[u + 1]
+        self.dest.insert(end, v)
+        self.km.insert(end, km)
+        self.minutes.insert(end, minutes)
+        for i in range(u + 1, len(self.offsets)):
+            self.offsets[i] += 1
+        position = self.carrier_offsets[end]
+        self.carrier_ids[position:position] = array('H', [self.carrier_registry.intern(name) for name in carriers])
+        self.carrier_offsets.insert(end + 1, position)
+        for i in range(end + 1, len(self.carrier_offsets)):
+            self.carrier_offsets[i] += len(carriers)
+        for i in range(len(self.in_edge)):
+            if self.in_edge[i] >= end:
+                self.in_edge[i] += 1
+        position = self.in_offsets[v + 1]
+        self.in_src.insert(position, u)
+        self.in_edge.insert(position, end)
+        for i in range(v + 1, len(self.in_offsets)):
+            self.in_offsets[i] += 1
+        self.density_layers = None
+
+    def adjacency(self, airport):
+        start, end = self.offsets[airport], self.offsets[airport + 1]
+        return self.dest[start:end], self.km[start:end], self.minutes[start:end]
+
+    def incoming_adjacency(self, airport):
+        start, end = self.in_offsets[airport], self.in_offsets[airport + 1]
+        return self.in_src[start:end], self.in_edge[start:end]
+
+    def edge_carriers(self, edge):
+        names = self.carrier_registry.names
+        return [names[c] for c in self.carrier_ids[self.carrier_offsets[edge]:self.carrier_offsets[edge + 1]]]
+
+    def route_carrier_counts(self, airport):
+        # number of carriers on each route in adjacency(airport) order
+        carrier_offsets = self.carrier_offsets
+        return [carrier_offsets[e + 1] - carrier_offsets[e] for e in range(self.offsets[airport], self.offsets[airport + 1])]
+
+    def has_carrier(self, edge, name):
+        carrier = self.carrier_registry.get_id(name)
+        return carrier is not None and carrier in self.carrier_ids[self.carrier_offsets[edge]:self.carrier_offsets[edge + 1]]
+
+    def memory_bytes(self):
+        columns = (self.offsets, self.dest, self.km, self.minutes, self.carrier_offsets, self.carrier_ids,
+                   self.in_offsets, self.in_src, self.in_edge)
+        return sum(len(column) * column.itemsize for column in columns)
+
     def get_routes(self, iata):
-        return self.graph.get(iata, [])
-    
+        airport = self.ids.get(iata)
+        if airport is None:
+            return []
+        start, end = self.offsets[airport], self.offsets[airport + 1]
+        return [{
+            "destination": self.codes[self.dest[e]],
+            "km": self.km[e],
+            "min": self.minutes[e],
+            "carriers": self.edge_carriers(e)
+        } for e in range(start, end)]
+
+    def get_incoming_routes(self, iata):
+        airport = self.ids.get(iata)
+        if airport is None:
+            return []
+        start, end = self.in_offsets[airport], self.in_offsets[airport + 1]
+        return [{
+            "origin": self.codes[self.in_src[i]],
+            "km": self.km[self.in_edge[i]],
+            "min": self.minutes[self.in_edge[i]],
+            "carriers": self.edge_carriers(self.in_edge[i])
+        } for i in range(start, end)]
+
     def get_airport_info(self, iata):
         return self.airport_info.get(iata, {})
 
     def get_neighboring_airports(self, iata, max_distance=500):
         src_info = self.get_airport_info(iata)
         if not src_info:
-            return []  
+            return []
 
-        src_lat = src_info["latitude"]
-        src_lon = src_info["longitude"]
-        src_country_code = src_info["country_code"]
-        neighbors = []
+        neighbors = self.airports_within(src_info.latitude, src_info.longitude, max_distance, src_info.country_code)
+        return [airport for airport, distance in neighbors if airport != iata]
 
-        for airport, info in self.airport_info.items():
-            if airport == iata:
-                continue  
-
-            if info["country_code"] != src_country_code:
-                continue
-
-            dest_lat = info["latitude"]
-            dest_lon = info["longitude"]
-            distance = self.calculate_distance(src_lat, src_lon, dest_lat, dest_lon)
-
-            if distance <= max_distance:
-                neighbors.append(airport)
-
-        return neighbors
-    
     def display_graph(self):
         for airport, routes in self.graph.items():
             info = self.airport_info[airport]
             print(f"{airport} ({info['name']}, {info['country']}, {info['country_code']}, {info['latitude']}, {info['longitude']})")
             for route in routes:
-                print(f"  -> {route['destination']} ({', '.join(route['carriers'])}) - {route['km']} km, {route['min']} min")
\ No newline at end of file
+                print(f"  -> {route['destination']} ({', '.join(route['carriers'])}) - {route['km']} km, {route['min']} min")
+
+
+class VersionedGraph:
+    # Read-copy-update holder for the shared graph. Readers take `current`
+    # once and keep that immutable snapshot for the whole search; writers
+    # mutate a private copy and publish it with a single reference swap.
+    def __init__(self, graph):
+        self.lock = threading.Lock()
+        self.current = graph
+
+    def update(self, mutate):
+        with self.lock:
+            graph = self.current.copy()
+            mutate(graph)
+            graph.version = self.current.version + 1
+            self.current = graph
+        return graph
+
+    def publish(self, graph):
+        with self.lock:
+            graph.version = self.current.version + 1
+            self.current = graph
+        return graph
+
+    def add_airport(self, iata, name, country, country_code, latitude, longitude):
+        return self.update(lambda graph: graph.add_airport(iata, name, country, country_code, latitude, longitude))
+
+    def add_route(self, from_iata, to_iata, km, minutes, carriers):
+        return self.update(lambda graph: graph.add_route(from_iata, to_iata, km, minutes, carriers))
+
+
+def iter_airports(f, chunk_size=1 << 20):
+    # Streams the top-level {"IATA": {...}, ...} object of airline_routes.json
+    # one airport at a time, so the full document never exists as dicts.
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size)
+    pos = 0
+    eof = False
+
+    def skip(pos, chars):
+        nonlocal buffer, eof
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return pos
+            buffer = f.read(chunk_size)
+            pos = 0
+            eof = not buffer
+
+    def decode(pos):
+        nonlocal buffer, eof
+        while True:
+            try:
+                return decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = f.read(chunk_size)
+                eof = not more
+                buffer = buffer[pos:] + more
+                pos = 0
+
+    pos = skip(pos, " \t\r\n")
+    if buffer[pos:pos + 1] != "{":
+        raise ValueError("expected a JSON object of airports")
+    pos += 1
+    while True:
+        pos = skip(pos, " \t\r\n,")
+        if buffer[pos:pos + 1] == "}":
+            return
+        iata, pos = decode(pos)
+        pos = skip(pos, " \t\r\n:")
+        airport, pos = decode(pos)
+        yield iata, airport
+
+
+def load_airport_graph(path):
+    graph = AirportGraph({})
+    with open(path, encoding='utf-8') as f:
+        graph.load_airports(iter_airports(f))
+    return graph
\ No newline at end of file
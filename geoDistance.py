@@ -0,0 +1,65 @@
+import numpy as np
+
+from dataParser import EARTH_RADIUS_KM
+from reachability import GraphCache
+
+# Batch great-circle distances. Every function takes arrays (or anything
+# np.asarray accepts) and does one vectorised haversine instead of a Python
+# loop over pairs; results match AirportGraph.great_circle_km.
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    # all arguments in radians, broadcast against each other
+    sin_dlat = np.sin((lat2 - lat1) / 2)
+    sin_dlon = np.sin((lon2 - lon1) / 2)
+    h = sin_dlat * sin_dlat + np.cos(lat1) * np.cos(lat2) * sin_dlon * sin_dlon
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(h), np.sqrt(1 - h))
+
+
+def airport_radians(graph, airports=None):
+    lat = np.array(graph.lat_rad)
+    lon = np.array(graph.lon_rad)
+    if airports is None:
+        return lat, lon
+    airports = np.asarray(airports, dtype=np.intp)
+    return lat[airports], lon[airports]
+
+
+def airport_ids(graph, codes):
+    return np.array([graph.ids[iata] for iata in codes], dtype=np.intp)
+
+
+def one_to_many(graph, source, targets=None):
+    # distance from airport id `source` to each id in targets (default: all)
+    lat, lon = airport_radians(graph, targets)
+    return haversine_km(graph.lat_rad[source], graph.lon_rad[source], lat, lon)
+
+
+def many_to_many(graph, sources, targets=None):
+    # len(sources) x len(targets) distance matrix
+    src_lat, src_lon = airport_radians(graph, sources)
+    lat, lon = airport_radians(graph, targets)
+    return haversine_km(src_lat[:, None], src_lon[:, None], lat[None, :], lon[None, :])
+
+
+def path_legs(graph, path):
+    # distance of every consecutive leg along a path of airport ids
+    lat, lon = airport_radians(graph, path)
+    return haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:])
+
+
+def from_coordinates(latitudes, longitudes, graph, targets=None):
+    # len(latitudes) x len(targets) matrix from arbitrary points in degrees
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    target_lat, target_lon = airport_radians(graph, targets)
+    return haversine_km(lat[:, None], lon[:, None], target_lat[None, :], target_lon[None, :])
+
+
+def distance_table(graph, goal):
+    # distance-to-goal for every airport as a plain list, cheap to index per
+    # A* relaxation
+    return one_to_many(graph, goal).tolist()
+
+
+heuristic_cache = GraphCache(distance_table, max_entries=64)
@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import graphSnapshot
+
+
+def validate_graph(graph):
+    n = len(graph.codes)
+    if not graph.airport_info:
+        raise ValueError("reloaded graph has no airports")
+    if len(graph.offsets) != n + 1 or graph.offsets[n] != len(graph.dest):
+        raise ValueError("reloaded graph has inconsistent route offsets")
+    if len(graph.in_offsets) != n + 1 or graph.in_offsets[n] != len(graph.dest):
+        raise ValueError("reloaded graph has an inconsistent incoming-route index")
+    if len(graph.dest) and (min(graph.dest) < 0 or max(graph.dest) >= n):
+        raise ValueError("reloaded graph has routes to unknown airports")
+
+
+class GraphReloader:
+    # Rebuilds the graph from the dataset without blocking request threads:
+    # the JSON is compiled into a snapshot by a separate python process (so
+    # the parse does not hold this process's GIL), then the snapshot is
+    # mapped, validated and published to the VersionedGraph in one swap.
+    def __init__(self, graph_store, json_path, snapshot_path, prepare=None):
+        self.graph_store = graph_store
+        self.json_path = json_path
+        self.snapshot_path = snapshot_path
+        self.prepare = prepare
+        self.lock = threading.Lock()
+        self.thread = None
+        self.status = {"state": "idle", "version": graph_store.current.version}
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return False
+            self.status = {"state": "building", "version": self.graph_store.current.version}
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+            return True
+
+    def run(self):
+        staging_path = self.snapshot_path + ".reload"
+        try:
+            start_time = time.perf_counter()
+            subprocess.run([sys.executable, graphSnapshot.__file__, self.json_path, staging_path],
+                           check=True, capture_output=True)
+            build_seconds = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            graph = graphSnapshot.load_snapshot(staging_path)
+            validate_graph(graph)
+            if self.prepare is not None:
+                graph = self.prepare(graph)
+            load_seconds = time.perf_counter() - start_time
+
+            # everything that can fail runs before the swap: compressed and
+            # sqlite graphs keep no dest array, so count routes from offsets
+            status = {
+                "state": "done",
+                "version": None,
+                "airports": len(graph.codes),
+                "routes": graph.offsets[-1],
+                "build_seconds": round(build_seconds, 3),
+                "load_seconds": round(load_seconds, 3),
+            }
+
+            start_time = time.perf_counter()
+            self.graph_store.publish(graph)
+            swap_seconds = time.perf_counter() - start_time
+            status["version"] = graph.version
+            status["swap_seconds"] = round(swap_seconds, 6)
+
+            # the mapping stays valid after the rename, and the next restart
+            # picks up the new snapshot directly; the new graph is already
+            # live, so a failure here is reported without undoing the swap
+            try:
+                os.replace(staging_path, self.snapshot_path)
+            except OSError as e:
+                status["snapshot_error"] = str(e)
+            self.status = status
+        except subprocess.CalledProcessError as e:
+            self.status = {"state": "failed", "version": self.graph_store.current.version,
+                           "error": (e.stderr.decode('utf-8', 'replace').strip().splitlines() or [str(e)])[-1]}
+        except Exception as e:
+            self.status = {"state": "failed", "version": self.graph_store.current.version, "error": str(e)}
+        print("Graph reload →", self.status)
@@ -0,0 +1,242 @@
+import math
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import Sequence
+
+import dataParser
+import routeDensity
+
+# Snapshot layout: a fixed header followed by 8-byte aligned sections.
+# Every section is a native little-endian array so the loader can hand out
+# memoryviews straight over the mapped file without copying anything.
+MAGIC = b'AGRSNAP\0'
+VERSION = 5
+HEADER = struct.Struct('<8sIIqqq')
+SECTION = struct.Struct('<qq')
+SECTIONS = [
+    ('offsets', 'q'),
+    ('dest', 'i'),
+    ('km', 'i'),
+    ('minutes', 'i'),
+    ('carrier_offsets', 'q'),
+    ('carrier_ids', 'H'),
+    ('in_offsets', 'q'),
+    ('in_src', 'i'),
+    ('in_edge', 'q'),
+    ('latitude', 'd'),
+    ('longitude', 'd'),
+    ('has_info', 'B'),
+    ('airport_string_offsets', 'q'),
+    ('airport_strings', 'B'),
+    ('carrier_string_offsets', 'q'),
+    ('carrier_strings', 'B'),
+    ('geometry_offsets', 'q'),
+    ('geometry', 'B'),
+    ('density_cell_offsets', 'q'),
+    ('density_cells', 'd'),
+    ('density_flow_offsets', 'q'),
+    ('density_flows', 'q'),
+]
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class StringTable(Sequence):
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __getitem__(self, index):
+        return bytes(self.blob[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+def encode_strings(strings):
+    offsets = array('q', [0])
+    blob = bytearray()
+    for s in strings:
+        blob += s.encode('utf-8')
+        offsets.append(len(blob))
+    return offsets, array('B', blob)
+
+
+def encode_density_layers(layers):
+    # the flat cell and flow arrays of every routeDensity level back to
+    # back; the offsets count cells and flows, not array items
+    cell_offsets = array('q', [0])
+    cells = array('d')
+    flow_offsets = array('q', [0])
+    flows = array('q')
+    for zoom, cell_degrees in routeDensity.LEVELS:
+        cells.extend(layers[zoom].cells)
+        flows.extend(layers[zoom].flows)
+        cell_offsets.append(len(cells) // 3)
+        flow_offsets.append(len(flows) // 4)
+    return cell_offsets, cells, flow_offsets, flows
+
+
+def map_density_layers(cell_offsets, cells, flow_offsets, flows):
+    return {zoom: routeDensity.DensityLayer(zoom, cell_degrees,
+                                            cells[3 * cell_offsets[i]:3 * cell_offsets[i + 1]],
+                                            flows[4 * flow_offsets[i]:4 * flow_offsets[i + 1]])
+            for i, (zoom, cell_degrees) in enumerate(routeDensity.LEVELS)}
+
+
+def write_snapshot(graph, path):
+    n = len(graph.codes)
+    carrier_names = graph.carrier_registry.names
+    latitude = array('d', [float('nan')] * n)
+    longitude = array('d', [float('nan')] * n)
+    has_info = array('B', [0] * n)
+    airport_strings = []
+    for airport, iata in enumerate(graph.codes):
+        info = graph.airport_info.get(iata)
+        if info:
+            latitude[airport] = graph.latitude[airport]
+            longitude[airport] = graph.longitude[airport]
+            has_info[airport] = 1
+            airport_strings.extend((iata, info["name"], info["country"], info["country_code"]))
+        else:
+            airport_strings.extend((iata, "", "", ""))
+
+    airport_string_offsets, airport_blob = encode_strings(airport_strings)
+    carrier_string_offsets, carrier_blob = encode_strings(carrier_names)
+    geometry_offsets, geometry = encode_strings(
+        ' '.join(graph.route_geometry(u, graph.dest[e]))
+        for u in range(n) for e in range(graph.offsets[u], graph.offsets[u + 1]))
+    density_cell_offsets, density_cells, density_flow_offsets, density_flows = \
+        encode_density_layers(graph.get_density_layers())
+    arrays = {
+        'offsets': array('q', graph.offsets),
+        'dest': array('i', graph.dest),
+        'km': array('i', graph.km),
+        'minutes': array('i', graph.minutes),
+        'carrier_offsets': array('q', graph.carrier_offsets),
+        'carrier_ids': array('H', graph.carrier_ids),
+        'in_offsets': array('q', graph.in_offsets),
+        'in_src': array('i', graph.in_src),
+        'in_edge': array('q', graph.in_edge),
+        'latitude': latitude,
+        'longitude': longitude,
+        'has_info': has_info,
+        'airport_string_offsets': airport_string_offsets,
+        'airport_strings': airport_blob,
+        'carrier_string_offsets': carrier_string_offsets,
+        'carrier_strings': carrier_blob,
+        'geometry_offsets': geometry_offsets,
+        'geometry': geometry,
+        'density_cell_offsets': density_cell_offsets,
+        'density_cells': density_cells,
+        'density_flow_offsets': density_flow_offsets,
+        'density_flows': density_flows,
+    }
+
+    table_size = HEADER.size + SECTION.size * len(SECTIONS)
+    position = table_size
+    table = bytearray()
+    payload = bytearray()
+    for name, typecode in SECTIONS:
+        data = arrays[name].tobytes()
+        padding = -position % 8
+        payload += b'\0' * padding
+        position += padding
+        table += SECTION.pack(position, len(data))
+        payload += data
+        position += len(data)
+
+    checksum = zlib.crc32(table + payload)
+    header = HEADER.pack(MAGIC, VERSION, checksum, n, len(graph.dest), len(carrier_names))
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(table)
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def compile_snapshot(json_path, snapshot_path):
+    graph = dataParser.load_airport_graph(json_path)
+    write_snapshot(graph, snapshot_path)
+    return graph
+
+
+def load_snapshot(path, verify=True):
+    if sys.byteorder != 'little':
+        raise SnapshotError("graph snapshots are little-endian only")
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mm)
+    if len(view) < HEADER.size:
+        raise SnapshotError(f"{path} is too short to be a graph snapshot")
+    magic, version, checksum, n, edge_count, carrier_count = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise SnapshotError(f"{path} is not a graph snapshot")
+    if version != VERSION:
+        raise SnapshotError(f"{path} has snapshot version {version}, expected {VERSION}")
+    if verify and zlib.crc32(view[HEADER.size:]) != checksum:
+        raise SnapshotError(f"{path} failed its checksum, recompile it")
+
+    sections = {}
+    for i, (name, typecode) in enumerate(SECTIONS):
+        start, length = SECTION.unpack_from(view, HEADER.size + i * SECTION.size)
+        sections[name] = view[start:start + length].cast(typecode)
+
+    codes = StringTable(sections['airport_string_offsets'], sections['airport_strings'])
+    carrier_names = StringTable(sections['carrier_string_offsets'], sections['carrier_strings'])
+
+    graph = dataParser.AirportGraph({})
+    graph.codes = [codes[4 * airport] for airport in range(n)]
+    graph.ids = {iata: airport for airport, iata in enumerate(graph.codes)}
+    graph.latitude = sections['latitude']
+    graph.longitude = sections['longitude']
+    for column in (graph.lat_rad, graph.lon_rad, graph.sin_lat, graph.cos_lat):
+        column.extend([math.nan] * n)
+    for airport, iata in enumerate(graph.codes):
+        if sections['has_info'][airport]:
+            graph.airport_info[iata] = dataParser.Airport(
+                iata, codes[4 * airport + 1], codes[4 * airport + 2], codes[4 * airport + 3],
+                graph.latitude[airport], graph.longitude[airport])
+            graph.set_trig(airport)
+    graph.offsets = sections['offsets']
+    graph.dest = sections['dest']
+    graph.km = sections['km']
+    graph.minutes = sections['minutes']
+    graph.carrier_registry = dataParser.CarrierRegistry(carrier_names)
+    graph.carrier_offsets = sections['carrier_offsets']
+    graph.carrier_ids = sections['carrier_ids']
+    graph.in_offsets = sections['in_offsets']
+    graph.in_src = sections['in_src']
+    graph.in_edge = sections['in_edge']
+    graph.geometry_offsets = sections['geometry_offsets']
+    graph.geometry = sections['geometry']
+    graph.density_layers = map_density_layers(sections['density_cell_offsets'], sections['density_cells'],
+                                              sections['density_flow_offsets'], sections['density_flows'])
+    graph.snapshot = mm
+    return graph
+
+
+def load_graph(json_path, snapshot_path):
+    # prefer the compiled snapshot, falling back to the JSON when the
+    # snapshot is missing or older than the dataset it was built from
+    if os.path.exists(snapshot_path) and os.path.getmtime(snapshot_path) >= os.path.getmtime(json_path):
+        try:
+            return load_snapshot(snapshot_path)
+        except SnapshotError as e:
+            print("Ignoring graph snapshot:", e)
+    return dataParser.load_airport_graph(json_path)
+
+
+if __name__ == '__main__':
+    json_path = sys.argv[1] if len(sys.argv) > 1 else 'dataset/airline_routes.json'
+    snapshot_path = sys.argv[2] if len(sys.argv) > 2 else 'dataset/airline_routes.graph'
+    graph = compile_snapshot(json_path, snapshot_path)
+    print(f"Wrote {snapshot_path}: {len(graph.codes)} airports, {len(graph.dest)} routes, "
+          f"{os.path.getsize(snapshot_path)} bytes")
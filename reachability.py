@@ -0,0 +1,97 @@
+import heapq
+import threading
+import weakref
+from array import array
+from collections import OrderedDict
+
+# One-to-all bounded searches: everything reachable from an origin within a
+# flight-time and stop budget, in one pass instead of one search per
+# destination, and everything that can reach a destination within k flights.
+
+UNREACHABLE = 255
+MIN_HOPS = 3
+
+
+def isochrone(graph, source, max_minutes, max_stops):
+    # Stop-layered Dijkstra on minutes. A label (minutes, flights, airport)
+    # is only worth expanding if it reaches the airport with fewer flights
+    # than every earlier (so faster) label did; labels pop in time order, so
+    # the first one to settle an airport is its fastest itinerary.
+    # Returns (airports, minutes, stops) for every airport reached, fastest first.
+    n = len(graph.codes)
+    max_flights = max_stops + 1
+    fewest_flights = array('h', [max_flights + 1]) * n
+    airports = array('i')
+    minutes = array('i')
+    stops = array('h')
+    heap = [(0, 0, source)]
+    while heap:
+        time, flights, airport = heapq.heappop(heap)
+        if flights >= fewest_flights[airport]:
+            continue
+        if fewest_flights[airport] > max_flights and airport != source:
+            airports.append(airport)
+            minutes.append(time)
+            stops.append(flights - 1)
+        fewest_flights[airport] = flights
+        if flights == max_flights:
+            continue
+        for neighbor, km, flight_minutes in zip(*graph.adjacency(airport)):
+            arrival = time + flight_minutes
+            if arrival <= max_minutes and flights + 1 < fewest_flights[neighbor]:
+                heapq.heappush(heap, (arrival, flights + 1, neighbor))
+    return airports, minutes, stops
+
+
+def hops_to(graph, target, max_hops):
+    # hops[v] = fewest flights from v to target, or UNREACHABLE beyond
+    # max_hops; the airports that reach target within k flights are exactly
+    # those with hops[v] <= k, so one byte per airport holds every k-hop
+    # set. Built breadth-first over the incoming routes.
+    hops = bytearray([UNREACHABLE]) * len(graph.codes)
+    hops[target] = 0
+    frontier = [target]
+    for depth in range(1, max_hops + 1):
+        next_frontier = []
+        for airport in frontier:
+            for source in graph.incoming_adjacency(airport)[0]:
+                if hops[source] == UNREACHABLE:
+                    hops[source] = depth
+                    next_frontier.append(source)
+        frontier = next_frontier
+    return bytes(hops)
+
+
+class GraphCache:
+    # LRU of compute(graph, *key) results per graph; keys also carry the
+    # airport, route and located-airport counts so in-place additions miss
+    # the cache, including add_airport placing an airport add_route created
+    def __init__(self, compute, max_entries=256):
+        self.compute = compute
+        self.max_entries = max_entries
+        self.results = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+    def get(self, graph, *args):
+        key = args + (len(graph.codes), graph.offsets[-1], len(graph.airport_info))
+        with self.lock:
+            results = self.results.setdefault(graph, OrderedDict())
+            result = results.get(key)
+            if result is not None:
+                results.move_to_end(key)
+                return result
+        result = self.compute(graph, *args)
+        with self.lock:
+            results[key] = result
+            while len(results) > self.max_entries:
+                results.popitem(last=False)
+        return result
+
+
+isochrone_cache = GraphCache(isochrone)
+hop_cache = GraphCache(hops_to)
+
+
+def hops_within(graph, target, max_hops):
+    # the 1-, 2- and 3-hop sets are always built, deeper ones on demand
+    return hop_cache.get(graph, target, max(MIN_HOPS, max_hops))
@@ -0,0 +1,96 @@
+import math
+from array import array
+
+# Level-of-detail layers for drawing the whole network. Each level buckets
+# airports into lat/lon cells and sums every route into a flow between the
+# two cells it connects, so a zoomed-out map draws a few hundred weighted
+# lines instead of one polyline per route. Carrier counts stand in for
+# capacity since the dataset has no seat numbers.
+
+# map zoom at which a level takes over -> cell size in degrees
+LEVELS = ((0, 20), (2, 10), (4, 5), (6, 2))
+
+
+def level_for_zoom(zoom):
+    chosen = LEVELS[0]
+    for level in LEVELS:
+        if zoom >= level[0]:
+            chosen = level
+    return chosen
+
+
+class DensityLayer:
+    # cells holds (latitude, longitude, airports) per cell, the mean position
+    # of the airports in it; flows holds (cell a, cell b, routes, carriers)
+    # per flow with a < b, both directions of a route counted into the same
+    # flow. Both are flat arrays so a snapshot can map them without copying.
+    def __init__(self, zoom, cell_degrees, cells, flows):
+        self.zoom = zoom
+        self.cell_degrees = cell_degrees
+        self.cells = cells
+        self.flows = flows
+
+    def to_json(self):
+        # parallel arrays instead of one object per flow keep the payload small
+        cells, flows = self.cells, self.flows
+        return {
+            "zoom": self.zoom,
+            "cellDegrees": self.cell_degrees,
+            "cells": [[cells[i], cells[i + 1], int(cells[i + 2])] for i in range(0, len(cells), 3)],
+            "flows": [list(flows[i:i + 4]) for i in range(0, len(flows), 4)]
+        }
+
+
+def build_layer(graph, zoom, cell_degrees):
+    columns = int(360 // cell_degrees)
+    cell_of = [None] * len(graph.codes)
+    members = {}
+    for airport in range(len(graph.codes)):
+        latitude, longitude = graph.latitude[airport], graph.longitude[airport]
+        if math.isnan(latitude):
+            continue
+        row = int((min(latitude, 89.999999) + 90) // cell_degrees)
+        column = int((longitude + 180) // cell_degrees) % columns
+        cell_of[airport] = row * columns + column
+        members.setdefault(cell_of[airport], []).append(airport)
+
+    cells = array('d')
+    index = {}
+    for key in sorted(members):
+        airports = members[key]
+        index[key] = len(index)
+        cells.extend((
+            round(sum(graph.latitude[a] for a in airports) / len(airports), 3),
+            round(sum(graph.longitude[a] for a in airports) / len(airports), 3),
+            len(airports)
+        ))
+    cell_of = [None if key is None else index[key] for key in cell_of]
+
+    flows = {}
+    for u in range(len(graph.codes)):
+        if cell_of[u] is None:
+            continue
+        a = cell_of[u]
+        for v, carriers in zip(graph.adjacency(u)[0], graph.route_carrier_counts(u)):
+            if cell_of[v] is None:
+                continue
+            b = cell_of[v]
+            if a == b:
+                continue
+            key = (a, b) if a < b else (b, a)
+            flow = flows.get(key)
+            if flow is None:
+                flows[key] = [1, carriers]
+            else:
+                flow[0] += 1
+                flow[1] += carriers
+    flat = array('q')
+    for (a, b), (routes, carriers) in sorted(flows.items()):
+        flat.extend((a, b, routes, carriers))
+    return DensityLayer(zoom, cell_degrees, cells, flat)
+
+
+def build_layers(graph):
+    # slow (a pass over every route per level): the snapshot compiler runs
+    # it offline and stores the result, other graphs build it on first use
+    return {zoom: build_layer(graph, zoom, cell_degrees) for zoom, cell_degrees in LEVELS}
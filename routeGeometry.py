@@ -0,0 +1,90 @@
+import math
+
+from spatialIndex import EARTH_RADIUS_KM
+
+# Great-circle geometry for drawing routes. A leg is sampled every
+# POINT_SPACING_KM along the great circle (short hops stay a straight
+# segment), cut wherever it crosses the antimeridian so map clients never
+# draw a line across the whole world, and each piece is stored as an
+# encoded polyline (the Google format, 1e-5 degree precision), which
+# Leaflet and most map libraries decode directly.
+
+POINT_SPACING_KM = 400
+MAX_SEGMENTS = 32
+PRECISION = 5
+
+
+def great_circle_points(lat1, lon1, lat2, lon2):
+    # (latitude, longitude) in degrees, endpoints included
+    phi1, lam1, phi2, lam2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.cos(phi1) * math.cos(lam1), math.cos(phi1) * math.sin(lam1), math.sin(phi1))
+    b = (math.cos(phi2) * math.cos(lam2), math.cos(phi2) * math.sin(lam2), math.sin(phi2))
+    angle = math.acos(max(-1.0, min(1.0, sum(x * y for x, y in zip(a, b)))))
+    segments = max(1, min(MAX_SEGMENTS, math.ceil(angle * EARTH_RADIUS_KM / POINT_SPACING_KM)))
+    if angle < 1e-9 or math.sin(angle) < 1e-9:
+        return [(lat1, lon1), (lat2, lon2)]
+    points = [(lat1, lon1)]
+    for i in range(1, segments):
+        t = i / segments
+        wa = math.sin((1 - t) * angle) / math.sin(angle)
+        wb = math.sin(t * angle) / math.sin(angle)
+        x, y, z = (wa * p + wb * q for p, q in zip(a, b))
+        points.append((math.degrees(math.atan2(z, math.hypot(x, y))), math.degrees(math.atan2(y, x))))
+    points.append((lat2, lon2))
+    return points
+
+
+def split_antimeridian(points):
+    parts = [[points[0]]]
+    for (lat1, lon1), (lat2, lon2) in zip(points, points[1:]):
+        if abs(lon2 - lon1) > 180:
+            # unwrap lon2 next to lon1, then find where the segment meets +-180
+            edge = 180.0 if lon1 > 0 else -180.0
+            unwrapped = lon2 + 360 if lon1 > 0 else lon2 - 360
+            t = (edge - lon1) / (unwrapped - lon1)
+            lat = lat1 + t * (lat2 - lat1)
+            parts[-1].append((lat, edge))
+            parts.append([(lat, -edge)])
+        parts[-1].append((lat2, lon2))
+    return parts
+
+
+def encode_polyline(points):
+    scale = 10 ** PRECISION
+    out = []
+    previous = (0, 0)
+    for point in points:
+        current = (round(point[0] * scale), round(point[1] * scale))
+        for value, last in zip(current, previous):
+            value -= last
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        previous = current
+    return ''.join(out)
+
+
+def decode_polyline(encoded):
+    scale = 10 ** PRECISION
+    points = []
+    values = [0, 0]
+    pos = 0
+    while pos < len(encoded):
+        for i in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[pos]) - 63
+                pos += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            values[i] += ~(result >> 1) if result & 1 else result >> 1
+        points.append((values[0] / scale, values[1] / scale))
+    return points
+
+
+def leg_polylines(lat1, lon1, lat2, lon2):
+    return [encode_polyline(part) for part in split_antimeridian(great_circle_points(lat1, lon1, lat2, lon2))]
@@ -1,26 +1,59 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 import algorithms
+import compressedGraph
 import dataParser
+import graphReload
+import graphSnapshot
 import json
+import math
+import os
+import reachability
+import sqliteGraph
 
 app = Flask(__name__)
 CORS(app)
 
-with open('dataset/airline_routes.json') as f:
-    data = json.load(f)
+ROUTES_PATH = 'dataset/airline_routes.json'
+SNAPSHOT_PATH = 'dataset/airline_routes.graph'
+SQLITE_PATH = 'dataset/airline_routes.sqlite'
+# "memory" keeps the plain CSR arrays, "compressed" trades search speed for
+# a much smaller varint-encoded adjacency, "sqlite" keeps routes on disk
+GRAPH_STORAGE = os.environ.get('GRAPH_STORAGE', 'memory')
 
-with open('dataset/currency.json') as f:
-    currency_data = json.load(f)
-currency_rates = currency_data.get("rates", {})
+def load_currency_rates():
+    with open('dataset/currency.json') as f:
+        currency_data = json.load(f)
+    return currency_data.get("rates", {})
 
+def prepare_graph(graph):
+    # density layers come precomputed from a snapshot; otherwise they are
+    # built by the first /routes/density request rather than at startup
+    if GRAPH_STORAGE == 'compressed':
+        return compressedGraph.CompressedAirportGraph(graph)
+    if GRAPH_STORAGE == 'sqlite':
+        sqliteGraph.write_sqlite(graph, SQLITE_PATH)
+        sqlite_graph = sqliteGraph.SqliteAirportGraph(SQLITE_PATH)
+        sqlite_graph.density_layers = graph.density_layers
+        return sqlite_graph
+    return graph
 
-graph = dataParser.AirportGraph(data)
+def open_graph():
+    if GRAPH_STORAGE == 'sqlite':
+        return sqliteGraph.open_graph(ROUTES_PATH, SQLITE_PATH)
+    return prepare_graph(graphSnapshot.load_graph(ROUTES_PATH, SNAPSHOT_PATH))
 
-def format_routes(routes):
+currency_rates = load_currency_rates()
+
+
+graph_store = dataParser.VersionedGraph(open_graph())
+reloader = graphReload.GraphReloader(graph_store, ROUTES_PATH, SNAPSHOT_PATH, prepare_graph)
+
+def format_routes(routes, graph_version):
     formatted = []
     for r in routes:
         if isinstance(r, dict):
+            r["graphVersion"] = graph_version
             formatted.append(r)
         elif isinstance(r, (tuple, list)) and len(r) >= 6:
             route_data = {
@@ -29,7 +62,8 @@ def format_routes(routes):
                 "duration": r[2],
                 "price": r[3],
                 "cabin": r[4],
-                "routeLabel": r[5] if r[5] == "Alternative via Nearby Airport" else ""
+                "routeLabel": r[5] if r[5] == "Alternative via Nearby Airport" else "",
+                "graphVersion": graph_version
             }
 
             if len(r) >= 7:
@@ -38,6 +72,11 @@ def format_routes(routes):
     return formatted
 
 
+MAX_ROUTES_K = 100
+
+def is_airport_set(spec):
+    return spec is not None and (',' in spec or ':' in spec)
+
 @app.route('/routes', methods=['GET'])
 def get_routes():
     departure = request.args.get('departure')
@@ -52,7 +91,32 @@ def get_routes():
     trip_type = request.args.get('tripType', 'oneway')
     mode = request.args.get('mode')
     print("Received Request →", request.args)
-    if mode == 'quick':
+    # pin one graph version for the whole request, concurrent reloads and
+    # route additions publish a new graph instead of touching this one
+    graph = graph_store.current
+    if is_airport_set(departure) or is_airport_set(destination):
+        # "country:JP", "NRT,HND" or "near:LAT,LON,KM" on either end
+        if not departure or not destination:
+            return jsonify({"error": "departure and destination are both required"}), 400
+        try:
+            departures = graph.resolve_airports(departure)
+            destinations = graph.resolve_airports(destination)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        routes = algorithms.find_set_flights(graph, departures, destinations, stops, cabin)
+    elif request.args.get('k') and not (trip_type == 'multicity' and middle):
+        # the k shortest itineraries by distance, found without enumerating the rest
+        try:
+            k = min(int(request.args['k']), MAX_ROUTES_K)
+        except ValueError:
+            return jsonify({"error": "k must be an integer"}), 400
+        if k < 1:
+            return jsonify({"error": "k must be at least 1"}), 400
+        routes = algorithms.find_k_shortest_flights(graph, departure, destination, stops, cabin, k)
+    elif mode == 'pareto' and not (trip_type == 'multicity' and middle):
+        # every itinerary not beaten on distance, duration, stops and price at once
+        routes = algorithms.find_pareto_flights(graph, departure, destination, stops, cabin)
+    elif mode == 'quick':
         if trip_type == 'multicity' and middle:
             routes = algorithms.find_multi_city_flights_aStarSearch(graph, departure, middle, destination, 1, route_type, cabin)
         else:
@@ -63,19 +127,194 @@ def get_routes():
         else:
             routes = algorithms.find_one_way_flights(graph, departure, destination, stops, cabin)
 
-    formatted_routes = format_routes(routes)
+    formatted_routes = format_routes(routes, graph.version)
     selected_currency = request.args.get('currency', 'SGD')
     rate_info = currency_rates.get(selected_currency, {"rate": 1.0, "symbol": selected_currency})
     conversion_rate = rate_info.get("rate", 1.0)
 
+    with_geometry = request.args.get('geometry') in ('1', 'true')
     for r in formatted_routes:
         r["price"] = round(r["price"] * conversion_rate, 2)
         r["currency"] = selected_currency
         r["symbol"] = rate_info.get("symbol", selected_currency)
+        if with_geometry:
+            r["geometry"] = graph.path_geometry(r["path"])
 
     print("Found Routes →", formatted_routes[:10])
 
-    return jsonify(formatted_routes)
+    response = jsonify(formatted_routes)
+    response.headers["X-Graph-Version"] = str(graph.version)
+    return response
+
+@app.route('/routes/geometry', methods=['GET'])
+def get_route_geometry():
+    # encoded great-circle polylines for each leg of ?path=SIN,LHR,JFK
+    path = [iata for iata in request.args.get('path', '').split(',') if iata]
+    if len(path) < 2:
+        return jsonify({"error": "path must list at least two airports"}), 400
+    graph = graph_store.current
+    legs = graph.path_geometry(path)
+    missing = [f"{a}-{b}" for a, b, leg in zip(path, path[1:], legs) if not leg]
+    if missing:
+        return jsonify({"error": f"no route for {', '.join(missing)}"}), 400
+    response = jsonify({"path": path, "legs": legs})
+    response.headers["X-Graph-Version"] = str(graph.version)
+    return response
+
+@app.route('/airports/nearest', methods=['GET'])
+def get_nearest_airports():
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        k = min(int(request.args.get('k', 5)), 100)
+        min_routes = int(request.args.get('minRoutes', 0))
+    except (KeyError, ValueError):
+        return jsonify({"error": "lat and lon are required numbers, k and minRoutes must be integers"}), 400
+    if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        return jsonify({"error": "lat must be within [-90, 90] and lon within [-180, 180]"}), 400
+    if k < 1:
+        return jsonify({"error": "k must be at least 1"}), 400
+    country = request.args.get('country')
+
+    graph = graph_store.current
+    airports = []
+    for iata, distance in graph.nearest_airports(lat, lon, k, country, min_routes):
+        info = graph.get_airport_info(iata)
+        airport = graph.ids[iata]
+        airports.append({
+            "iata": iata,
+            "name": info.name,
+            "country": info.country,
+            "country_code": info.country_code,
+            "latitude": info.latitude,
+            "longitude": info.longitude,
+            "distance": round(distance, 2),
+            "routes": graph.offsets[airport + 1] - graph.offsets[airport]
+        })
+    response = jsonify(airports)
+    response.headers["X-Graph-Version"] = str(graph.version)
+    return response
+
+MAX_ISOCHRONE_STOPS = 4
+
+@app.route('/airports/reachable', methods=['GET'])
+def get_reachable_airports():
+    origin = request.args.get('origin')
+    try:
+        max_minutes = int(request.args['maxMinutes'])
+        max_stops = int(request.args.get('maxStops', 1))
+    except (KeyError, ValueError):
+        return jsonify({"error": "maxMinutes is a required integer and maxStops an integer"}), 400
+    if max_minutes < 0 or not 0 <= max_stops <= MAX_ISOCHRONE_STOPS:
+        return jsonify({"error": f"maxMinutes must be positive and maxStops within [0, {MAX_ISOCHRONE_STOPS}]"}), 400
+    graph = graph_store.current
+    source = graph.ids.get(origin)
+    if source is None:
+        return jsonify({"error": f"unknown airport {origin!r}"}), 400
+
+    airports, minutes, stops = reachability.isochrone_cache.get(graph, source, max_minutes, max_stops)
+    # parallel arrays, one entry per reachable airport, fastest first;
+    # airports only known as route destinations have no position (null)
+    latitude = [graph.latitude[airport] for airport in airports]
+    longitude = [graph.longitude[airport] for airport in airports]
+    response = jsonify({
+        "origin": origin,
+        "maxMinutes": max_minutes,
+        "maxStops": max_stops,
+        "airports": [graph.codes[airport] for airport in airports],
+        "latitude": [None if math.isnan(value) else value for value in latitude],
+        "longitude": [None if math.isnan(value) else value for value in longitude],
+        "minutes": minutes.tolist(),
+        "stops": stops.tolist(),
+        "graphVersion": graph.version
+    })
+    response.headers["X-Graph-Version"] = str(graph.version)
+    return response
+
+# below this zoom only the busiest airports in the box are worth drawing
+DETAIL_ZOOM = 6
+
+@app.route('/airports/viewport', methods=['GET'])
+def get_viewport():
+    try:
+        south = float(request.args['south'])
+        west = float(request.args['west'])
+        north = float(request.args['north'])
+        east = float(request.args['east'])
+        zoom = float(request.args.get('zoom', DETAIL_ZOOM))
+        limit = min(int(request.args.get('limit', 300)), 5000)
+    except (KeyError, ValueError):
+        return jsonify({"error": "south, west, north and east are required numbers"}), 400
+    if south > north:
+        return jsonify({"error": "south must not be greater than north"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be at least 1"}), 400
+    south, north = max(south, -90), min(north, 90)
+    # map clients report longitudes past +-180 when the world wraps
+    if east - west >= 360:
+        west, east = -180, 180
+    else:
+        west = (west + 180) % 360 - 180
+        east = (east + 180) % 360 - 180
+    with_routes = request.args.get('routes') in ('1', 'true')
+
+    graph = graph_store.current
+    offsets = graph.offsets
+    airports = [graph.ids[iata] for iata in graph.airports_in_box(south, west, north, east)]
+    airports.sort(key=lambda airport: offsets[airport] - offsets[airport + 1])
+    if zoom < DETAIL_ZOOM:
+        airports = airports[:limit]
+    else:
+        airports = airports[:5000]
+
+    result = {"airports": []}
+    for airport in airports:
+        info = graph.airport_info[graph.codes[airport]]
+        result["airports"].append({
+            "iata": info.iata,
+            "name": info.name,
+            "latitude": info.latitude,
+            "longitude": info.longitude,
+            "routes": offsets[airport + 1] - offsets[airport]
+        })
+    if with_routes:
+        shown = set(airports)
+        segments = set()
+        for airport in airports:
+            for neighbor in graph.adjacency(airport)[0]:
+                if neighbor in shown:
+                    segments.add((min(airport, neighbor), max(airport, neighbor)))
+        result["routes"] = [[graph.codes[a], graph.codes[b]] for a, b in sorted(segments)]
+    response = jsonify(result)
+    response.headers["X-Graph-Version"] = str(graph.version)
+    return response
+
+@app.route('/routes/density', methods=['GET'])
+def get_route_density():
+    try:
+        zoom = float(request.args.get('zoom', 0))
+        min_routes = int(request.args.get('minRoutes', 1))
+    except ValueError:
+        return jsonify({"error": "zoom must be a number and minRoutes an integer"}), 400
+    graph = graph_store.current
+    layer = graph.density_layer(zoom).to_json()
+    if min_routes > 1:
+        layer["flows"] = [flow for flow in layer["flows"] if flow[2] >= min_routes]
+    layer["graphVersion"] = graph.version
+    response = jsonify(layer)
+    response.headers["X-Graph-Version"] = str(graph.version)
+    return response
+
+@app.route('/admin/reload', methods=['POST'])
+def reload_dataset():
+    global currency_rates
+    currency_rates = load_currency_rates()
+    started = reloader.start()
+    return jsonify(reloader.status), 202 if started else 409
+
+@app.route('/admin/reload', methods=['GET'])
+def reload_status():
+    return jsonify(reloader.status)
 
 @app.errorhandler(Exception)
 def handle_error(e):
@@ -0,0 +1,159 @@
+import heapq
+import math
+from array import array
+
+EARTH_RADIUS_KM = 6378
+
+
+def unit_vector(latitude, longitude):
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+def km_to_chord(km):
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+
+class SpatialIndex:
+    # k-d tree over airport positions as 3-d unit vectors, so distances never
+    # wrap at the antimeridian and straight-line (chord) distance orders
+    # points exactly like great-circle distance. The tree is implicit: the
+    # median of points[lo:hi] sits at (lo + hi) // 2, split on axes[mid].
+    # Points added after the build go to a small pending list that queries
+    # scan directly; the tree is rebuilt once that list grows.
+    def __init__(self, points=(), rebuild_after=64):
+        self.rebuild_after = rebuild_after
+        self.pending = []
+        self.build(list(points))
+
+    def build(self, points):
+        self.ids = array('i', [0]) * len(points)
+        self.coords = [array('d', [0.0]) * len(points) for _ in range(3)]
+        self.axes = array('b', [0]) * len(points)
+        stack = [(0, len(points), points)]
+        while stack:
+            lo, hi, segment = stack.pop()
+            if not segment:
+                continue
+            spreads = [max(p[axis + 1] for p in segment) - min(p[axis + 1] for p in segment) for axis in range(3)]
+            axis = spreads.index(max(spreads))
+            segment.sort(key=lambda p: p[axis + 1])
+            half = len(segment) // 2
+            mid = lo + half
+            airport, x, y, z = segment[half]
+            self.ids[mid] = airport
+            self.coords[0][mid], self.coords[1][mid], self.coords[2][mid] = x, y, z
+            self.axes[mid] = axis
+            stack.append((lo, mid, segment[:half]))
+            stack.append((mid + 1, hi, segment[half + 1:]))
+
+    def points(self):
+        xs, ys, zs = self.coords
+        return [(self.ids[i], xs[i], ys[i], zs[i]) for i in range(len(self.ids))] + self.pending
+
+    def add(self, airport, x, y, z):
+        self.pending.append((airport, x, y, z))
+        if len(self.pending) > self.rebuild_after:
+            points = self.points()
+            self.pending = []
+            self.build(points)
+
+    def within(self, point, chord, accept=None):
+        # (squared chord, airport) for every point no further than chord
+        qx, qy, qz = point
+        xs, ys, zs = self.coords
+        limit = chord * chord
+        found = []
+        stack = [(0, len(self.ids))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            dx, dy, dz = xs[mid] - qx, ys[mid] - qy, zs[mid] - qz
+            d2 = dx * dx + dy * dy + dz * dz
+            if d2 <= limit and (accept is None or accept(self.ids[mid])):
+                found.append((d2, self.ids[mid]))
+            diff = point[self.axes[mid]] - self.coords[self.axes[mid]][mid]
+            if diff <= chord:
+                stack.append((lo, mid))
+            if diff >= -chord:
+                stack.append((mid + 1, hi))
+        for airport, x, y, z in self.pending:
+            d2 = (x - qx) ** 2 + (y - qy) ** 2 + (z - qz) ** 2
+            if d2 <= limit and (accept is None or accept(airport)):
+                found.append((d2, airport))
+        return found
+
+    def nearest(self, point, k, accept=None):
+        # up to k (squared chord, airport) pairs, closest first
+        if k <= 0:
+            return []
+        qx, qy, qz = point
+        xs, ys, zs = self.coords
+        best = []
+
+        def offer(d2, airport):
+            if accept is not None and not accept(airport):
+                return
+            if len(best) < k:
+                heapq.heappush(best, (-d2, airport))
+            elif d2 < -best[0][0]:
+                heapq.heapreplace(best, (-d2, airport))
+
+        def visit(lo, hi):
+            if lo >= hi:
+                return
+            mid = (lo + hi) // 2
+            dx, dy, dz = xs[mid] - qx, ys[mid] - qy, zs[mid] - qz
+            offer(dx * dx + dy * dy + dz * dz, self.ids[mid])
+            diff = point[self.axes[mid]] - self.coords[self.axes[mid]][mid]
+            near, far = ((lo, mid), (mid + 1, hi)) if diff <= 0 else ((mid + 1, hi), (lo, mid))
+            visit(*near)
+            if len(best) < k or diff * diff < -best[0][0]:
+                visit(*far)
+
+        visit(0, len(self.ids))
+        for airport, x, y, z in self.pending:
+            offer((x - qx) ** 2 + (y - qy) ** 2 + (z - qz) ** 2, airport)
+        return sorted((-d2, airport) for d2, airport in best)
+
+
+class GridIndex:
+    # Fixed lat/lon grid for bounding-box (viewport) queries. Cells are
+    # cell_degrees square; a box with west > east crosses the antimeridian
+    # and is answered as two boxes.
+    def __init__(self, points=(), cell_degrees=2):
+        self.cell_degrees = cell_degrees
+        self.columns = int(360 // cell_degrees)
+        self.cells = {}
+        for airport, latitude, longitude in points:
+            self.add(airport, latitude, longitude)
+
+    def cell(self, latitude, longitude):
+        row = int((min(latitude, 89.999999) + 90) // self.cell_degrees)
+        column = int((longitude + 180) // self.cell_degrees) % self.columns
+        return row, column
+
+    def add(self, airport, latitude, longitude):
+        self.cells.setdefault(self.cell(latitude, longitude), []).append((airport, latitude, longitude))
+
+    def in_box(self, south, west, north, east):
+        if west > east:
+            return self.in_box(south, west, north, 180) + self.in_box(south, -180, north, east)
+        first_row, first_column = self.cell(south, west)
+        last_row, last_column = self.cell(north, east)
+        if east >= 180:
+            last_column = self.columns - 1
+        found = []
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                for airport, latitude, longitude in self.cells.get((row, column), ()):
+                    if south <= latitude <= north and west <= longitude <= east:
+                        found.append(airport)
+        return found
@@ -0,0 +1,235 @@
+import math
+import os
+import sqlite3
+import sys
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+
+import dataParser
+
+SCHEMA = """
+CREATE TABLE airports (
+    id INTEGER PRIMARY KEY,
+    iata TEXT NOT NULL UNIQUE,
+    name TEXT,
+    country TEXT,
+    country_code TEXT,
+    latitude REAL,
+    longitude REAL,
+    grid_cell INTEGER
+);
+CREATE INDEX airports_grid ON airports (grid_cell);
+CREATE TABLE carriers (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE routes (
+    src INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    dest INTEGER NOT NULL,
+    km INTEGER NOT NULL,
+    minutes INTEGER NOT NULL,
+    carrier_ids BLOB NOT NULL,
+    PRIMARY KEY (src, position)
+) WITHOUT ROWID;
+CREATE INDEX routes_dest ON routes (dest, src);
+"""
+
+GRID_DEGREES = 1
+
+
+def grid_cell(latitude, longitude):
+    # one-degree lat/lon cells numbered row by row
+    row = int((latitude + 90) // GRID_DEGREES)
+    column = int((longitude + 180) // GRID_DEGREES) % (360 // GRID_DEGREES)
+    return row * (360 // GRID_DEGREES) + column
+
+
+def write_sqlite(graph, path):
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    db = sqlite3.connect(tmp_path)
+    db.executescript(SCHEMA)
+    airports = []
+    for airport, iata in enumerate(graph.codes):
+        info = graph.airport_info.get(iata)
+        if info:
+            airports.append((airport, iata, info.name, info.country, info.country_code,
+                             info.latitude, info.longitude, grid_cell(info.latitude, info.longitude)))
+        else:
+            airports.append((airport, iata, None, None, None, None, None, None))
+    db.executemany("INSERT INTO airports VALUES (?, ?, ?, ?, ?, ?, ?, ?)", airports)
+    db.executemany("INSERT INTO carriers VALUES (?, ?)", enumerate(graph.carrier_registry.names))
+
+    def routes():
+        for u in range(len(graph.codes)):
+            start = graph.offsets[u]
+            dest, km, minutes = graph.adjacency(u)
+            for position in range(len(dest)):
+                edge = start + position
+                carriers = array('H', graph.carrier_ids[graph.carrier_offsets[edge]:graph.carrier_offsets[edge + 1]])
+                yield u, position, dest[position], km[position], minutes[position], carriers.tobytes()
+
+    db.executemany("INSERT INTO routes VALUES (?, ?, ?, ?, ?, ?)", routes())
+    db.commit()
+    db.close()
+    os.replace(tmp_path, path)
+
+
+class SqliteAirportGraph(dataParser.AirportGraph):
+    # Read-only AirportGraph whose routes stay on disk in SQLite. Airport ids,
+    # codes and coordinates (a few hundred KB) are resident; adjacency lists
+    # are fetched by primary key and kept in an LRU cache of page_cache rows,
+    # so the search functions run unchanged against it.
+    def __init__(self, path, page_cache=4096):
+        super().__init__({})
+        self.path = path
+        self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.page_cache = page_cache
+        self.cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        rows = self.db.execute("SELECT id, iata, name, country, country_code, latitude, longitude "
+                               "FROM airports ORDER BY id").fetchall()
+        self.codes = [row[1] for row in rows]
+        self.ids = {iata: airport for airport, iata in enumerate(self.codes)}
+        for column in (self.latitude, self.longitude, self.lat_rad, self.lon_rad, self.sin_lat, self.cos_lat):
+            column.extend([math.nan] * len(rows))
+        for airport, iata, name, country, country_code, latitude, longitude in rows:
+            if name is not None:
+                self.airport_info[iata] = dataParser.Airport(iata, name, country, country_code, latitude, longitude)
+                self.latitude[airport] = latitude
+                self.longitude[airport] = longitude
+                self.set_trig(airport)
+
+        self.carrier_registry = dataParser.CarrierRegistry(
+            name for carrier, name in self.db.execute("SELECT id, name FROM carriers ORDER BY id"))
+        counts = [0] * (len(rows) + 1)
+        for src, count in self.db.execute("SELECT src, COUNT(*) FROM routes GROUP BY src"):
+            counts[src + 1] = count
+        for airport in range(len(rows)):
+            counts[airport + 1] += counts[airport]
+        self.offsets = array('l', counts)
+        self.dest = self.km = self.minutes = None
+        self.carrier_offsets = self.carrier_ids = None
+        self.in_offsets = self.in_src = self.in_edge = None
+
+    def query(self, sql, params):
+        with self.lock:
+            return self.db.execute(sql, params).fetchall()
+
+    def adjacency(self, airport):
+        with self.lock:
+            row = self.cache.get(airport)
+            if row is not None:
+                self.cache.move_to_end(airport)
+                self.cache_hits += 1
+                return row
+        rows = self.query("SELECT dest, km, minutes FROM routes WHERE src = ? ORDER BY position", (airport,))
+        row = ([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows])
+        with self.lock:
+            self.cache_misses += 1
+            self.cache[airport] = row
+            if len(self.cache) > self.page_cache:
+                self.cache.popitem(last=False)
+        return row
+
+    def memory_bytes(self):
+        # only offsets and the cached rows are resident; rows are lists of
+        # Python ints, so count the objects rather than an array itemsize
+        with self.lock:
+            rows = list(self.cache.values())
+        size = len(self.offsets) * self.offsets.itemsize
+        for row in rows:
+            for column in row:
+                size += sys.getsizeof(column) + sum(sys.getsizeof(value) for value in column)
+        return size
+
+    def incoming_adjacency(self, airport):
+        rows = self.query("SELECT src, position FROM routes WHERE dest = ? ORDER BY src, position", (airport,))
+        return [src for src, position in rows], [self.offsets[src] + position for src, position in rows]
+
+    def carrier_names(self, blob):
+        names = self.carrier_registry.names
+        return [names[c] for c in array('H', blob)]
+
+    def edge_carriers(self, edge):
+        airport = bisect_right(self.offsets, edge) - 1
+        rows = self.query("SELECT carrier_ids FROM routes WHERE src = ? AND position = ?",
+                          (airport, edge - self.offsets[airport]))
+        return self.carrier_names(rows[0][0]) if rows else []
+
+    def route_carrier_counts(self, airport):
+        rows = self.query("SELECT length(carrier_ids) FROM routes WHERE src = ? ORDER BY position", (airport,))
+        return [size // 2 for (size,) in rows]
+
+    def has_carrier(self, edge, name):
+        return name in self.edge_carriers(edge)
+
+    def get_routes(self, iata):
+        airport = self.ids.get(iata)
+        if airport is None:
+            return []
+        rows = self.query("SELECT dest, km, minutes, carrier_ids FROM routes WHERE src = ? ORDER BY position",
+                          (airport,))
+        return [{
+            "destination": self.codes[dest],
+            "km": km,
+            "min": minutes,
+            "carriers": self.carrier_names(carriers)
+        } for dest, km, minutes, carriers in rows]
+
+    def get_incoming_routes(self, iata):
+        airport = self.ids.get(iata)
+        if airport is None:
+            return []
+        rows = self.query("SELECT src, km, minutes, carrier_ids FROM routes WHERE dest = ? ORDER BY src, position",
+                          (airport,))
+        return [{
+            "origin": self.codes[src],
+            "km": km,
+            "min": minutes,
+            "carriers": self.carrier_names(carriers)
+        } for src, km, minutes, carriers in rows]
+
+    def airports_in_box(self, south, west, north, east):
+        if west > east:
+            return self.airports_in_box(south, west, north, 180) + self.airports_in_box(south, -180, north, east)
+        cells = [grid_cell(lat, lon)
+                 for lat in range(math.floor(south), math.floor(north) + 1, GRID_DEGREES)
+                 for lon in range(math.floor(west), math.floor(east) + 1, GRID_DEGREES)]
+        found = []
+        for start in range(0, len(cells), 500):
+            chunk = cells[start:start + 500]
+            found.extend(self.query(
+                f"SELECT iata FROM airports WHERE grid_cell IN ({','.join('?' * len(chunk))}) "
+                "AND latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?",
+                (*chunk, south, north, west, east)))
+        return [iata for (iata,) in found]
+
+    def add_airport(self, iata, name, country, country_code, latitude, longitude):
+        raise TypeError("sqlite graphs are read-only, rebuild the database from the dataset")
+
+    def add_route(self, from_iata, to_iata, km, minutes, carriers):
+        raise TypeError("sqlite graphs are read-only, rebuild the database from the dataset")
+
+    def copy(self):
+        raise TypeError("sqlite graphs are read-only, rebuild the database from the dataset")
+
+
+def open_graph(json_path, sqlite_path, page_cache=4096):
+    if not os.path.exists(sqlite_path) or os.path.getmtime(sqlite_path) < os.path.getmtime(json_path):
+        write_sqlite(dataParser.load_airport_graph(json_path), sqlite_path)
+    return SqliteAirportGraph(sqlite_path, page_cache)
+
+
+if __name__ == '__main__':
+    json_path = sys.argv[1] if len(sys.argv) > 1 else 'dataset/airline_routes.json'
+    sqlite_path = sys.argv[2] if len(sys.argv) > 2 else 'dataset/airline_routes.sqlite'
+    write_sqlite(dataParser.load_airport_graph(json_path), sqlite_path)
+    print(f"Wrote {sqlite_path}: {os.path.getsize(sqlite_path)} bytes")
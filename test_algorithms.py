@@ -0,0 +1,76 @@
+import algorithms
+import dataParser
+
+
+def airport(name, country_code, latitude, longitude, routes=()):
+    return {
+        "name": name,
+        "country": country_code,
+        "country_code": country_code,
+        "latitude": latitude,
+        "longitude": longitude,
+        "routes": [{"iata": iata, "km": km, "min": minutes, "carriers": [{"name": "Test Air"}]}
+                   for iata, km, minutes in routes]
+    }
+
+
+def make_graph():
+    # HND has no inbound flights; NRT (about 60 km away) is served directly
+    # from SIN and via BKK
+    return dataParser.AirportGraph({
+        "SIN": airport("Singapore", "SG", 1.3502, 103.994, [("NRT", 5300, 420), ("BKK", 1430, 140)]),
+        "BKK": airport("Bangkok", "TH", 13.6811, 100.747, [("NRT", 4600, 360)]),
+        "NRT": airport("Narita", "JP", 35.7647, 140.386),
+        "HND": airport("Haneda", "JP", 35.5523, 139.78),
+    })
+
+
+def paths(routes):
+    return sorted(route[0] for route in routes)
+
+
+def test_nearby_fallback_takes_direct_hops_at_zero_stops():
+    graph = make_graph()
+    assert paths(algorithms.find_nearby_alternatives(graph, "SIN", "HND", 0)) == [["SIN", "NRT"]]
+    assert paths(algorithms.find_one_way_flights(graph, "SIN", "HND", 0)) == [["SIN", "NRT"]]
+
+
+def test_nearby_fallback_allows_one_intermediate_stop_per_stop():
+    graph = make_graph()
+    routes = algorithms.find_nearby_alternatives(graph, "SIN", "HND", 1)
+    assert paths(routes) == [["SIN", "BKK", "NRT"], ["SIN", "NRT"]]
+    assert all(route[5] == "Alternative via Nearby Airport" for route in routes)
+
+
+def test_set_search_uses_the_same_stops_meaning():
+    graph = make_graph()
+    japan = graph.resolve_airports("country:JP")
+    assert paths(algorithms.find_set_flights(graph, [graph.ids["SIN"]], japan, 0)) == [["SIN", "NRT"]]
+    assert paths(algorithms.find_set_flights(graph, [graph.ids["SIN"]], japan, 1)) == [["SIN", "BKK", "NRT"], ["SIN", "NRT"]]
+
+
+def test_k_shortest_returns_nothing_for_non_positive_k():
+    graph = make_graph()
+    assert algorithms.find_k_shortest_flights(graph, "SIN", "NRT", 1, "Economy", 0) == []
+    assert algorithms.find_k_shortest_flights(graph, "SIN", "NRT", 1, "Economy", -5) == []
+    assert paths(algorithms.find_k_shortest_flights(graph, "SIN", "NRT", 1, "Economy", 2)) == [["SIN", "BKK", "NRT"], ["SIN", "NRT"]]
+
+
+def test_route_table_only_lists_dataset_airports():
+    graph = dataParser.AirportGraph({
+        "SIN": airport("Singapore", "SG", 1.3502, 103.994, [("ZZZ", 100, 30)]),
+    })
+    assert list(graph.graph) == ["SIN"]
+    assert "ZZZ" not in graph.graph
+    graph.display_graph()
+
+
+def test_astar_sees_coordinates_added_in_place():
+    graph = dataParser.AirportGraph({
+        "SIN": airport("Singapore", "SG", 1.3502, 103.994, [("XXX", 2000, 180)]),
+        "NRT": airport("Narita", "JP", 35.7647, 140.386),
+    })
+    graph.add_route("XXX", "NRT", 3300, 240, ["Test Air"])
+    assert algorithms.astar_search(graph, "SIN", "NRT") == []
+    graph.add_airport("XXX", "Somewhere", "Testland", "XX", 20.0, 120.0)
+    assert paths(algorithms.astar_search(graph, "SIN", "NRT")) == [["SIN", "XXX", "NRT"]]